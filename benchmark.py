@@ -0,0 +1,467 @@
+# Benchmarks of the image processing functions
+# usage: python benchmark.py [name ...]
+
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# app_modules must be imported before main to resolve the circular GUI imports
+import app_modules
+from main import MainWindow, ModelRegistry, PatchGrid
+
+
+# Extract patch from image matrix for the reference AMF filter
+def extract_patch_reference(matrix, x, y, patch_size=3):
+    height, width = matrix.shape
+    size = patch_size // 2
+    x_begin, x_end = max(x - size, 0), min(x + size, height - 1)
+    y_begin, y_end = max(y - size, 0), min(y + size, width - 1)
+
+    output = []
+    for i in range(x_begin, x_end + 1):
+        for j in range(y_begin, y_end + 1):
+            output.append(matrix[i][j])
+    return output
+
+
+# Per-pixel adaptive median filter, reference for MainWindow.amf
+def amf_reference(matrix, max_patch_size=15):
+    output = np.copy(matrix)
+    height, width = matrix.shape
+
+    for x in range(height):
+        for y in range(width):
+            patch_size = 3
+            patch = extract_patch_reference(matrix, x, y, patch_size)
+            patch_min = np.min(patch)
+            patch_max = np.max(patch)
+            patch.sort()
+            patch_median = patch[len(patch) // 2]
+
+            if not patch_min < matrix[x][y] < patch_max:
+                while True:
+                    if 0 < patch_median < 255:
+                        output[x][y] = patch_median
+                        break
+                    patch_size = patch_size + 2
+                    if patch_size > max_patch_size:
+                        break
+                    patch = extract_patch_reference(matrix, x, y, patch_size)
+                    patch.sort()
+                    patch_median = patch[len(patch) // 2]
+
+    return output
+
+
+# Reconstruct image from patches by pairwise stacking, reference for MainWindow.reconstruct_patches
+def reconstruct_reference(patches):
+    side = int(math.sqrt(len(patches)))
+    image = None
+    for r in range(0, len(patches), side):
+        row = patches[r]
+        for patch in patches[r + 1:r + side]:
+            row = np.hstack((row, patch))
+        image = row if image is None else np.vstack((image, row))
+    return image
+
+
+# Extract patches with one reshape per patch, reference for MainWindow.extract_patches_gray
+def extract_patches_gray_reference(image, patch_size):
+    import tensorflow as tf
+    image = MainWindow.pad_to_patches(image, patch_size)
+    patches = tf.image.extract_patches(images=tf.expand_dims(image[:, :, np.newaxis], 0),
+                                       sizes=[1, patch_size, patch_size, 1],
+                                       strides=[1, patch_size, patch_size, 1],
+                                       rates=[1, 1, 1, 1],
+                                       padding='SAME')
+    _, x, y, _ = patches.shape
+    return [np.array(tf.reshape(patches[0, r, c], shape=(patch_size, patch_size, 1)))
+            for r in range(x) for c in range(y)]
+
+
+# Measure execution time of a function
+def timeit(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# Convolutional auto-encoder standing in for the de-noising models, which need the saved weights
+def autoencoder_model(patch_size, channels):
+    import tensorflow as tf
+    inputs = tf.keras.Input((patch_size, patch_size, channels))
+    x = tf.keras.layers.Conv2D(32, 3, strides=2, padding="same", activation="relu")(inputs)
+    x = tf.keras.layers.Conv2D(64, 3, strides=2, padding="same", activation="relu")(x)
+    x = tf.keras.layers.Conv2DTranspose(32, 3, strides=2, padding="same", activation="relu")(x)
+    x = tf.keras.layers.Conv2DTranspose(channels, 3, strides=2, padding="same", activation="sigmoid")(x)
+    return tf.keras.Model(inputs, x)
+
+
+# Noised grayscale test image
+def noised_image(size, intensity, rng, dtype=np.float32):
+    image = rng.integers(0, 256, size=size).astype(dtype)
+    return MainWindow.sp_noise(image, intensity, rng)
+
+
+# Vectorized AMF filter against the per-pixel reference
+def benchmark_amf():
+    rng = np.random.default_rng(0)
+    for size in [(64, 64), (128, 96), (256, 256)]:
+        for intensity in [0.1, 0.3, 0.5]:
+            image = noised_image(size, intensity, rng)
+            expected, reference_time = timeit(amf_reference, image)
+            output, amf_time = timeit(MainWindow.amf, image)
+            assert np.array_equal(output, expected), "AMF output differs from reference"
+            print(f"amf {size[0]}x{size[1]} {int(intensity * 100)}%: reference {reference_time:.3f}s, "
+                  f"vectorized {amf_time:.3f}s, x{reference_time / amf_time:.1f}")
+
+
+# AMF filter of a color image in one pass against one pass per channel
+def benchmark_amf_color():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(1024, 1024, 3)).astype(np.uint8)
+    for per_channel in [False, True]:
+        noised = MainWindow.sp_noise(image, 0.3, rng, per_channel=per_channel)
+        output, color_time = timeit(MainWindow.amf, noised)
+        channel_outputs, channels_time = timeit(lambda: [MainWindow.amf(noised[..., k]) for k in range(3)])
+        assert np.array_equal(output, np.stack(channel_outputs, axis=-1)), "color AMF differs from channel AMF"
+        print(f"amf 1024x1024x3 30% per channel noise {per_channel}: one pass {color_time:.3f}s, "
+              f"3 passes {channels_time:.3f}s, x{channels_time / color_time:.2f}")
+
+
+# Sparse AMF filter against the dense one, cost should follow the noise density
+def benchmark_amf_sparse():
+    rng = np.random.default_rng(0)
+    for intensity in [0.1, 0.2, 0.3, 0.4, 0.5]:
+        image = noised_image((1024, 1024), intensity, rng, np.uint8)
+        output, dense_time = timeit(MainWindow.amf, image)
+        sparse_output, sparse_time = timeit(MainWindow.amf, image, sparse=True)
+
+        # impulse pixels are filtered the same way, the other pixels are left untouched
+        impulses = (image == 0) | (image == 255)
+        assert np.array_equal(sparse_output[impulses], output[impulses]), "sparse AMF differs on impulses"
+        assert np.array_equal(sparse_output[~impulses], image[~impulses]), "sparse AMF changed clean pixels"
+        print(f"amf 1024x1024 {int(intensity * 100)}%: dense {dense_time:.3f}s, sparse {sparse_time:.3f}s")
+
+
+# Tiled AMF filter scaling with the number of worker processes
+def benchmark_amf_tiled():
+    rng = np.random.default_rng(0)
+    image = noised_image((4096, 4096), 0.3, rng, np.uint8)
+    output, single_time = timeit(MainWindow.amf, image)
+    print(f"amf 4096x4096 single process: {single_time:.3f}s")
+    for workers in [1, 2, 4, 8]:
+        tiled_output, tiled_time = timeit(MainWindow.amf_tiled, image, workers=workers, tile_size=512)
+        assert np.array_equal(tiled_output, output), "tiled AMF differs from whole image AMF"
+        print(f"amf 4096x4096 {workers} workers: {tiled_time:.3f}s, x{single_time / tiled_time:.2f}")
+
+
+# Histogram AMF backend against the sort backend for growing patch sizes
+def benchmark_amf_histogram():
+    rng = np.random.default_rng(0)
+    image = noised_image((512, 512), 0.5, rng, np.uint8)
+    for max_patch_size in [3, 15, 31]:
+        output = MainWindow.amf(image, max_patch_size)
+        histogram_output = MainWindow.amf(image, max_patch_size, backend="histogram")
+        assert np.array_equal(histogram_output, output), "histogram AMF differs from sort AMF"
+
+    # statistics of every pixel for a fixed patch size, amf only grows the patch of a few pixels
+    image = image[..., np.newaxis]
+    rows, cols = np.indices((128, 128)).reshape(2, -1) + 192
+    chans = np.zeros_like(rows)
+    for patch_size in range(3, 33, 2):
+        margin = patch_size // 2
+        padded = MainWindow._amf_pad(image, margin)
+        _, sort_time = timeit(MainWindow._amf_statistics, padded, image.shape, margin, rows, cols, chans,
+                              patch_size, "sort", extremes=True)
+        _, histogram_time = timeit(MainWindow._amf_statistics, image, image.shape, margin, rows, cols, chans,
+                                   patch_size, "histogram", extremes=True)
+        print(f"amf patch {patch_size}x{patch_size}: sort {sort_time * 1e6 / len(rows):.2f}us/pixel, "
+              f"histogram {histogram_time * 1e6 / len(rows):.2f}us/pixel")
+
+
+# Patch extraction with a strided view against the list of slices
+def benchmark_patches():
+    image = np.zeros((4096, 4096, 3), dtype=np.float32)
+    grid, grid_time = timeit(MainWindow.patch_grid, image, 64)
+    patches, batch_time = timeit(MainWindow.image_to_patches, image, 64)
+    slices, list_time = timeit(lambda: [image[r:r + 64, c:c + 64] for r in range(0, 4096, 64)
+                                        for c in range(0, 4096, 64)])
+    _, stack_time = timeit(np.stack, slices)
+    print(f"patches 4096x4096x3: grid view {grid_time * 1e6:.0f}us, batch {batch_time * 1e3:.1f}ms, "
+          f"list {list_time * 1e3:.1f}ms + stack {stack_time * 1e3:.1f}ms")
+
+
+# Patches of a batch of images in one pass against one image at a time
+def benchmark_patches_batch():
+    rng = np.random.default_rng(0)
+    images = rng.random((16, 512, 512, 3), dtype=np.float32)
+    (patches, index), batch_time = timeit(MainWindow.batch_to_patches, images, 64)
+    output, rebuild_time = timeit(MainWindow.batch_from_patches, patches, (16, 8, 8))
+    assert np.array_equal(output, images), "batch reconstruction differs from images"
+    shuffled = rng.permutation(len(patches))
+    assert np.array_equal(MainWindow.batch_from_patches(patches[shuffled], (16, 8, 8), index[shuffled]), images), \
+        "indexed batch reconstruction differs from images"
+
+    def one_by_one():
+        return [MainWindow.reconstruct_patches(MainWindow.image_to_patches(image, 64), (8, 8)) for image in images]
+    _, loop_time = timeit(one_by_one)
+    print(f"patches batch 16x512x512x3: extract {batch_time * 1e3:.1f}ms + reconstruct {rebuild_time * 1e3:.1f}ms, "
+          f"image by image {loop_time * 1e3:.1f}ms")
+
+
+# Grayscale patch extraction with one reshape against one reshape per patch
+def benchmark_patches_gray():
+    rng = np.random.default_rng(0)
+    for size in [520, 1024, 2048]:
+        image = rng.random((size, size), dtype=np.float32)
+        patches, batch_time = timeit(MainWindow.extract_patches_gray, image, 40)
+        expected, reference_time = timeit(extract_patches_gray_reference, image, 40)
+        assert np.array_equal(patches, np.stack(expected)), "patches differ from reference"
+        print(f"patches gray {size}x{size}: {len(patches)} patches, batch {batch_time * 1e3:.1f}ms, "
+              f"per patch {reference_time * 1e3:.1f}ms")
+
+
+# Image reconstruction from a grid of patches against stacking rows of patches
+def benchmark_reconstruct():
+    rng = np.random.default_rng(0)
+    for size in [1024, 2048, 4096]:
+        image = rng.random((size, size, 3), dtype=np.float32)
+        patches = MainWindow.image_to_patches(image, 64)
+        output, grid_time = timeit(MainWindow.reconstruct_patches, patches, (size // 64, size // 64))
+        expected, reference_time = timeit(reconstruct_reference, list(patches))
+        assert np.array_equal(output, expected), "reconstruction differs from reference"
+        assert np.array_equal(MainWindow.reconstruct_patches(patches[:size // 64 * 2], (2, size // 64)),
+                              image[:128]), "rectangular reconstruction differs from image"
+        print(f"reconstruct {size}x{size}x3: grid {grid_time * 1e3:.1f}ms, stack {reference_time * 1e3:.1f}ms")
+
+
+# Overlapping tile prediction cost for growing overlap ratios
+def benchmark_overlap():
+    rng = np.random.default_rng(0)
+    image = rng.random((1024, 1024, 3), dtype=np.float32)
+    model = autoencoder_model(64, 3)
+    grid_shape = MainWindow.patch_grid(image, 64).shape[:2]
+
+    def predict():
+        patches = model.predict(MainWindow.image_to_patches(image, 64), batch_size=32, verbose=0)
+        return MainWindow.reconstruct_patches(patches, grid_shape)
+
+    # first prediction builds the predict function
+    predict()
+    _, base_time = timeit(predict)
+    print(f"overlap 1024x1024x3 0%: {grid_shape[0] * grid_shape[1]} tiles, {base_time:.3f}s")
+    for overlap in [0.25, 0.5, 0.75]:
+        stride = 64 - int(round(64 * overlap))
+        grid = PatchGrid.covering(image.shape, 64, stride)
+        tiles = grid.rows * grid.cols
+        tracemalloc.start()
+        _, overlap_time = timeit(MainWindow.predict_overlap, image, model, grid)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"overlap 1024x1024x3 {int(overlap * 100)}%: {tiles} tiles, {overlap_time:.3f}s, "
+              f"x{overlap_time / base_time:.1f}, numpy peak {peak / 2 ** 20:.1f}MB")
+
+
+# Streaming de-noising of a memory-mapped image, numpy peak memory for growing numbers of tile rows in memory
+def benchmark_streaming():
+    import streaming
+    rng = np.random.default_rng(0)
+    model = autoencoder_model(64, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.npy")
+        image = np.lib.format.open_memmap(input_path, mode="w+", dtype=np.uint8, shape=(4096, 4096))
+        image[:] = rng.integers(0, 256, size=image.shape, dtype=np.uint8)
+        image.flush()
+        del image
+
+        for rows_in_memory in [1, 4, 16]:
+            tracemalloc.start()
+            _, stream_time = timeit(streaming.denoise_file, input_path, os.path.join(directory, "output"),
+                                    rows_in_memory=rows_in_memory, model=model)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"streaming 4096x4096 {rows_in_memory} tile rows: {stream_time:.3f}s, "
+                  f"numpy peak {peak / 2 ** 20:.1f}MB")
+
+
+# Prediction of a document-like image with and without dedup of identical patches
+def benchmark_dedup():
+    rng = np.random.default_rng(0)
+    model = autoencoder_model(64, 1)
+
+    # white page with text-like noisy blocks on a fraction of the patches
+    image = np.ones((2048, 2048, 1), dtype=np.float32)
+    for row, col in rng.integers(0, 2048 - 64, size=(150, 2)):
+        image[row:row + 64, col:col + 64] = rng.random((64, 64, 1), dtype=np.float32)
+    patches = MainWindow.image_to_patches(image, 64)
+
+    # first predictions trace the inference function
+    MainWindow.predict_patches(patches[:32], model, 32, dedup=True)
+    expected, base_time = timeit(MainWindow.predict_patches, patches, model, 32, dedup=False)
+    stats = {}
+    output, dedup_time = timeit(MainWindow.predict_patches, patches, model, 32, dedup=True, stats=stats)
+    assert np.allclose(output, expected, atol=1e-5), "dedup prediction differs"
+    print(f"dedup 2048x2048 page: hit rate {stats['dedup_hit_rate']:.2f}, dedup off {base_time:.3f}s, "
+          f"dedup on {dedup_time:.3f}s, x{base_time / dedup_time:.1f}")
+
+
+# PSNR with a peak value of 255 of images in [0, 1]
+def psnr(image1, image2):
+    rmse = np.sqrt(np.mean((np.float64(image1) - np.float64(image2)) ** 2)) * 255
+    return 20 * np.log10(255 / (rmse + np.finfo(np.float64).eps))
+
+
+# Low-variance patch bypass of the auto-encoder, fraction of bypassed patches and PSNR impact
+def benchmark_bypass():
+    rng = np.random.default_rng(0)
+
+    # flat and gradient background with striped blocks
+    clean_image = np.full((1024, 1024, 1), 0.8, dtype=np.float32)
+    clean_image[:512] = np.linspace(0.2, 0.8, 1024, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    y, x = np.mgrid[:128, :128]
+    for row, col in rng.integers(0, 1024 - 128, size=(20, 2)):
+        frequency = rng.uniform(0.05, 0.3)
+        clean_image[row:row + 128, col:col + 128, 0] = 0.5 + 0.4 * np.sin(frequency * (x + y))
+    noised_image = MainWindow.gauss_noise(clean_image, 0.1, rng)
+
+    # auto-encoder trained on the noised patches of the image
+    model = autoencoder_model(64, 1)
+    model.compile(optimizer="adam", loss="mse")
+    model.fit(MainWindow.image_to_patches(noised_image, 64), MainWindow.image_to_patches(clean_image, 64),
+              batch_size=16, epochs=60, verbose=0)
+    patches = MainWindow.image_to_patches(noised_image, 64)
+    model.predict(patches, batch_size=32, verbose=0)
+
+    for threshold in [0.0, 0.011, 0.015, 0.02]:
+        stats = {}
+        predictions, bypass_time = timeit(MainWindow.predict_patches, patches, model, 32,
+                                          bypass_threshold=threshold, stats=stats)
+        output = MainWindow.reconstruct_patches(predictions, (16, 16))
+        print(f"bypass 1024x1024 variance < {threshold}: {stats.get('bypass_rate', 0.0):.2f} bypassed, "
+              f"{bypass_time:.3f}s, PSNR {psnr(output, clean_image):.2f} (noised {psnr(noised_image, clean_image):.2f})")
+
+
+# Batched compiled prediction against one predict call per patch
+def benchmark_predict():
+    rng = np.random.default_rng(0)
+    image = rng.random((512, 512, 3), dtype=np.float32)
+    model = autoencoder_model(64, 3)
+    patches, grid = MainWindow.image_patches(image, 64)
+
+    def predict_per_patch():
+        return np.array([model.predict(patch[np.newaxis], verbose=0)[0] for patch in patches])
+
+    # first predictions build the predict functions
+    predict_per_patch()
+    expected, patch_time = timeit(predict_per_patch)
+    print(f"predict 512x512x3 per patch: {len(patches) / patch_time:.0f} patches/s")
+    for batch_size in [8, 32, 64]:
+        MainWindow.predict_patches(patches, model, batch_size)
+        stats = {}
+        output, batch_time = timeit(MainWindow.predict_patches, patches, model, batch_size, stats=stats)
+        assert np.allclose(output, expected, atol=1e-5), "batched prediction differs"
+        print(f"predict 512x512x3 batches of {batch_size}: {stats['patches_per_second']:.0f} patches/s, "
+              f"x{patch_time / batch_time:.1f}")
+
+
+# Model registry lookups against loading the saved model on every call
+def benchmark_registry():
+    registry = ModelRegistry()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "autoencoder.keras")
+        autoencoder_model(64, 1).save(path)
+        _, miss_time = timeit(registry.get, "autoencoder", path)
+        _, hit_time = timeit(registry.get, "autoencoder", path)
+        print(f"registry: load {miss_time * 1e3:.1f}ms, cached {hit_time * 1e6:.1f}us, {registry.stats()}")
+
+
+# Traces of the compiled inference function for varying numbers of patches and batch sizes
+def benchmark_retrace():
+    rng = np.random.default_rng(0)
+    model = autoencoder_model(40, 1)
+    traces = MainWindow.retrace_count
+    start = time.perf_counter()
+    for count in [1, 7, 32, 100, 257]:
+        for batch_size in [8, 32, 64]:
+            MainWindow.predict_patches(rng.random((count, 40, 40, 1), dtype=np.float32), model, batch_size)
+    print(f"retrace 15 predictions of 1 to 257 patches: {MainWindow.retrace_count - traces} trace(s), "
+          f"{time.perf_counter() - start:.3f}s")
+
+
+# Peak RSS in KB of this process since it started, ru_maxrss is kept across fork and exec
+# so the high-water mark of the process memory is read from /proc when available
+def peak_rss():
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Prediction of a 2048x2048x3 image by one mode in this process, prints it's time and peak RSS in KB
+def whole_image_worker(mode):
+    rng = np.random.default_rng(0)
+    image = rng.random((2048, 2048, 3), dtype=np.float32)
+    model = autoencoder_model(64, 3)
+
+    def predict():
+        if mode == "patches":
+            patches, grid = MainWindow.image_patches(image, 64)
+            return MainWindow.reconstruct_patches(MainWindow.predict_patches(patches, model, 32), grid)
+        return MainWindow.predict_whole(image, model, None if mode == "whole" else int(mode))
+
+    # first prediction traces the inference function
+    MainWindow.predict_patches(image[np.newaxis, :64, :64], model)
+    MainWindow.predict_whole(image[:64, :64], model, None)
+    output, seconds = timeit(predict)
+    assert output.shape == image.shape
+    print(seconds, peak_rss())
+
+
+# Whole-image inference of a fully convolutional auto-encoder against the patch path,
+# every mode runs in it's own process to measure it's peak RSS
+def benchmark_whole_image():
+    for mode in ["patches", "whole", "1024", "512"]:
+        result = subprocess.run([sys.executable, sys.argv[0], "--whole-image-worker", mode],
+                                capture_output=True, text=True, check=True)
+        seconds, rss = result.stdout.split()[-2:]
+        label = {"patches": "64x64 patches", "whole": "whole image"}.get(mode, f"{mode}x{mode} tiles")
+        print(f"whole_image 2048x2048x3 {label}: {2048 * 2048 / float(seconds) / 1e6:.2f} Mpixels/s, "
+              f"peak RSS {int(rss) / 1024:.0f} MB")
+
+
+BENCHMARKS = {
+    "amf": benchmark_amf,
+    "amf_sparse": benchmark_amf_sparse,
+    "amf_color": benchmark_amf_color,
+    "amf_tiled": benchmark_amf_tiled,
+    "amf_histogram": benchmark_amf_histogram,
+    "patches": benchmark_patches,
+    "patches_batch": benchmark_patches_batch,
+    "patches_gray": benchmark_patches_gray,
+    "reconstruct": benchmark_reconstruct,
+    "overlap": benchmark_overlap,
+    "streaming": benchmark_streaming,
+    "dedup": benchmark_dedup,
+    "bypass": benchmark_bypass,
+    "predict": benchmark_predict,
+    "registry": benchmark_registry,
+    "retrace": benchmark_retrace,
+    "whole_image": benchmark_whole_image,
+}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--whole-image-worker"]:
+        whole_image_worker(sys.argv[2])
+    else:
+        for name in sys.argv[1:] or BENCHMARKS:
+            BENCHMARKS[name]()
@@ -0,0 +1,69 @@
+# Streaming clean / noised patch pairs to train the de-noising auto-encoders
+# usage: dataset = make_dataset("./images", noise="gauss", color_mode="rgb")
+#        model.fit(dataset, steps_per_epoch=..., epochs=...)
+
+import numpy as np
+import tensorflow as tf
+
+# app_modules must be imported before main to resolve the circular GUI imports
+import app_modules
+from main import MainWindow, NoiseContext, PATCH_SIZES
+
+# noise intensity range of the GUI
+MIN_INTENSITY = 0.1
+MAX_INTENSITY = 0.5
+
+
+# Add noise of random intensity to a clean uint8 image, index selects the random stream
+# so that parallel calls are independent and reproducible
+def add_noise(image, index, noise, context):
+    rng = context.child(int(index)).generator()
+    intensity = rng.uniform(MIN_INTENSITY, MAX_INTENSITY)
+    if noise == "gauss":
+        return MainWindow.gauss_noise(image, intensity, rng)
+
+    # salt & pepper auto-encoder is fed with the AMF filtered image
+    noised_image = MainWindow.amf(MainWindow.sp_noise(image[..., 0], intensity, rng))
+    return (noised_image[..., np.newaxis] / 255).astype(np.float32)
+
+
+# Cut noised and clean images into the same non-overlapping patches as image_to_patches
+def extract_pairs(noised_image, clean_image, patch_size):
+    channels = clean_image.shape[-1]
+    images = tf.concat([noised_image, clean_image], axis=-1)[tf.newaxis]
+    patches = tf.image.extract_patches(images=images,
+                                       sizes=[1, patch_size, patch_size, 1],
+                                       strides=[1, patch_size, patch_size, 1],
+                                       rates=[1, 1, 1, 1],
+                                       padding='VALID')
+    patches = tf.reshape(patches, (-1, patch_size, patch_size, 2 * channels))
+    return patches[..., :channels], patches[..., channels:]
+
+
+# Dataset of (noised, clean) patch batches generated on the fly from the png images of image_dir
+# decoded images are cached in memory after the first epoch unless cache is False
+def make_dataset(image_dir, noise="gauss", color_mode="grayscale", batch_size=32, seed=None,
+                 cache=True, shuffle_buffer=1024):
+    context = NoiseContext(seed)
+    channels = 3 if color_mode == "rgb" else 1
+    patch_size = PATCH_SIZES[noise]
+    autotune = tf.data.experimental.AUTOTUNE
+
+    # read and decode clean images lazily
+    files = tf.data.Dataset.list_files(f"{image_dir}/*.png", shuffle=False)
+    images = files.map(lambda path: tf.io.decode_png(tf.io.read_file(path), channels=channels),
+                       num_parallel_calls=autotune)
+    if cache:
+        images = images.cache()
+    images = images.shuffle(64, seed=seed).repeat()
+
+    # noise every image with its own random stream
+    def noised_pair(index, image):
+        noised_image = tf.numpy_function(lambda image, index: add_noise(image, index, noise, context),
+                                         [image, index], tf.float32)
+        noised_image.set_shape([None, None, channels])
+        clean_image = tf.cast(image, tf.float32) / 255
+        return extract_pairs(noised_image, clean_image, patch_size)
+
+    pairs = images.enumerate().map(noised_pair, num_parallel_calls=autotune)
+    return pairs.unbatch().shuffle(shuffle_buffer, seed=seed).batch(batch_size).prefetch(autotune)
@@ -16,7 +16,12 @@
 
 import sys
 import os
+import io
 import math
+import json
+import time
+import threading
+from collections import OrderedDict
 from skimage.io import imsave
 import matplotlib.pyplot as plt
 import platform
@@ -25,13 +30,15 @@ import glob
 import cv2 as cv
 from builtins import staticmethod
 from datetime import datetime
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 
 import tensorflow as tf
 import numpy as np
 import random
 from PySide2 import QtCore, QtGui, QtWidgets
 from PIL import Image
-from PySide2.QtCore import (QCoreApplication, QPropertyAnimation, QDate, QDateTime, QMetaObject, QObject, QPoint, QRect, QSize, QTime, QUrl, Qt, QEvent)
+from PySide2.QtCore import (QCoreApplication, QPropertyAnimation, QDate, QDateTime, QMetaObject, QObject, QPoint, QRect, QSize, QTime, QUrl, Qt, QEvent, Signal)
 from PySide2.QtGui import (QBrush, QColor, QConicalGradient, QCursor, QFont, QFontDatabase, QIcon, QKeySequence, QLinearGradient, QPalette, QPainter, QPixmap, QRadialGradient)
 from PySide2.QtWidgets import *
 
@@ -40,7 +47,179 @@ from app_modules import *
 from ui_main import Ui_MainWindow
 
 
+# Random streams of noise generation, child contexts spawned per worker or per image
+# are independent and can be recreated from their recorded seed
+class NoiseContext:
+    def __init__(self, entropy=None, spawn_key=()):
+        self.seed_sequence = np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key))
+
+    # Spawn independent child contexts
+    def spawn(self, count):
+        return [NoiseContext(child.entropy, child.spawn_key) for child in self.seed_sequence.spawn(count)]
+
+    # Child context of given index, the same as the index-th child returned by spawn
+    def child(self, index):
+        return NoiseContext(self.seed_sequence.entropy, self.seed_sequence.spawn_key + (index,))
+
+    # New random generator at the start of the stream of this context
+    def generator(self):
+        return np.random.default_rng(self.seed_sequence)
+
+    # Seed to record in run metadata
+    def seed(self):
+        return {"entropy": self.seed_sequence.entropy, "spawn_key": list(self.seed_sequence.spawn_key)}
+
+    # Recreate context from a recorded seed
+    @staticmethod
+    def from_seed(seed):
+        return NoiseContext(seed["entropy"], seed["spawn_key"])
+
+
+# Saved models of the application by name
+MODEL_PATHS = {
+    "noise_classification_gray": "./models/noise_classification_gray.model",
+    "noise_classification_color": "./models/noise_classification_color.model",
+    "G-COLOR": "./models/G-COLOR.model",
+    "G-GRAY": "./models/G-GRAY.model",
+    "S-GRAY": "./models/S-GRAY.model",
+}
+
+
+# Input shape of a patch of every model, models are warmed up at these shapes
+MODEL_INPUT_SHAPES = {
+    "noise_classification_gray": (64, 64, 1),
+    "noise_classification_color": (64, 64, 3),
+    "G-COLOR": (64, 64, 3),
+    "G-GRAY": (64, 64, 1),
+    "S-GRAY": (40, 40, 1),
+}
+
+# patch size of the auto-encoders for each noise type
+PATCH_SIZES = {"gauss": MODEL_INPUT_SHAPES["G-GRAY"][0], "sp": MODEL_INPUT_SHAPES["S-GRAY"][0]}
+
+# Models loaded once on first use and kept resident, least recently used models are evicted
+# when the size of their weights exceeds memory_budget bytes, shared by all threads
+class ModelRegistry:
+    def __init__(self, memory_budget=1 << 30):
+        self.memory_budget = memory_budget
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.load_times = {}
+        self.load_time = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    # Model of given name, loaded from path or from MODEL_PATHS, the registry lock is only held for the lookup
+    # and the bookkeeping, loads hold a lock of their model so that a model is loaded once by concurrent calls
+    # without blocking calls for other models
+    def get(self, name, path=None):
+        key = (name, path or MODEL_PATHS[name])
+        with self.lock:
+            model = self.resident(key)
+            if model is not None:
+                return model
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self.lock:
+                model = self.resident(key)
+                if model is not None:
+                    return model
+                self.misses += 1
+
+            start_time = time.perf_counter()
+            model = models.load_model(key[1])
+            load_time = time.perf_counter() - start_time
+
+            with self.lock:
+                self.load_times[name] = load_time
+                self.load_time += load_time
+                self.models[key] = model
+                self.sizes[key] = sum(np.asarray(weight).nbytes for weight in model.weights)
+                self.load_locks.pop(key, None)
+                self.evict(keep=key)
+            return model
+
+    # Resident model of a key marked as most recently used, None when it is not loaded, called under the lock
+    def resident(self, key):
+        if key not in self.models:
+            return None
+        self.hits += 1
+        self.models.move_to_end(key)
+        return self.models[key]
+
+    # Evict least recently used models until the resident models fit in the memory budget
+    def evict(self, keep=None):
+        for key in list(self.models):
+            if self.memory() <= self.memory_budget:
+                break
+            if key != keep:
+                model = self.models.pop(key)
+                del self.sizes[key]
+                with MainWindow.inference_lock:
+                    MainWindow.inference_functions.pop(model, None)
+                    MainWindow.whole_image_functions.pop(model, None)
+                self.evictions += 1
+
+    # Size in bytes of the weights of the resident models
+    def memory(self):
+        return sum(self.sizes.values())
+
+    # Counters of the registry
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "load_time": self.load_time, "load_times": dict(self.load_times),
+                    "resident": [name for name, _ in self.models], "memory": self.memory()}
+
+
+# models of the application process
+model_registry = ModelRegistry()
+
+
+# Layout of the patches of an image, the image is reflect-padded by (bottom, right) padding rows and columns
+# and covered by rows x cols patches stride apart, the last row and column of patches are aligned on the end
+class PatchGrid:
+    __slots__ = ("image_shape", "patch_size", "stride", "padding", "rows", "cols")
+
+    def __init__(self, image_shape, patch_size, stride=None, padding=(0, 0)):
+        self.image_shape = tuple(image_shape)
+        self.patch_size = patch_size
+        self.stride = stride or patch_size
+        self.padding = tuple(padding)
+        height, width = self.padded_shape()[:2]
+        self.rows = -(-(height - patch_size) // self.stride) + 1
+        self.cols = -(-(width - patch_size) // self.stride) + 1
+
+    # Grid of patches stride apart of an image padded to whole patches, as MainWindow.pad_to_patches,
+    # patches don't overlap without stride
+    @staticmethod
+    def covering(image_shape, patch_size, stride=None):
+        return PatchGrid(image_shape, patch_size, stride,
+                         padding=(-image_shape[0] % patch_size, -image_shape[1] % patch_size))
+
+    # Top-left corners of the rows and of the columns of patches in the padded image
+    def positions(self):
+        height, width = self.padded_shape()[:2]
+        return (np.minimum(np.arange(self.rows) * self.stride, height - self.patch_size),
+                np.minimum(np.arange(self.cols) * self.stride, width - self.patch_size))
+
+    # Shape of the padded image
+    def padded_shape(self):
+        return (self.image_shape[0] + self.padding[0], self.image_shape[1] + self.padding[1]) + self.image_shape[2:]
+
+    # Image size as shown in the history
+    def size_label(self):
+        return f"{self.image_shape[1]}x{self.image_shape[0]}"
+
+
 class MainWindow(QMainWindow):
+    # emitted from the warm-up thread once every model is loaded and traced, with the names of the failed models
+    models_ready = Signal(list)
+
     def __init__(self):
         QMainWindow.__init__(self)
         self.ui = Ui_MainWindow()
@@ -48,15 +227,34 @@ class MainWindow(QMainWindow):
         self.folder_path = None
         self.original_img = None
         self.noised_img = None
+        self.noise_buffer = None
+        self.noise_fields = {}
+        self.noise_context = NoiseContext()
+        self.image_noise_context = None
         self.denoised_img = None
         self.type_img = "rgb"
         self.type_noise = "gauss"
         self.noise_intensity = 0.0
+        # fraction of a patch shared by neighbouring tiles at denoising, 0 for non-overlapping patches
+        self.patch_overlap = 0.0
+        # predict identical patches once, statistics of the last de-noising run are kept in run_stats
+        self.patch_dedup = False
+        self.run_stats = {}
+        # patches with a variance below the threshold are blurred instead of de-noised by the auto-encoder, 0 disables it
+        self.bypass_threshold = 0.0
+        # patches per call of the compiled auto-encoder
+        self.predict_batch_size = 32
+        # predict whole images with fully convolutional auto-encoders (G-COLOR, G-GRAY and S-GRAY),
+        # by tiles of the given size
+        self.whole_image = False
+        self.whole_image_tile_size = 1024
+        # save noised.png in the history, otherwise it's regenerated from noise.json where it is read
+        self.store_noised = True
 
         UIFunctions.removeTitleBar(True)
         self.setWindowTitle('AI Denoise - Graduation application')
         UIFunctions.labelTitle(self, 'AI Denoise - Graduation application')
-        UIFunctions.labelDescription(self, 'AI - Denoise')
+        UIFunctions.labelDescription(self, 'AI - Denoise (loading models)')
         startSize = QSize(1000, 750)
         self.resize(startSize)
         self.setMinimumSize(startSize)
@@ -76,6 +274,11 @@ class MainWindow(QMainWindow):
         self.ui.btn_denoising.clicked.connect(self.Button)
         self.ui.slider_intensity.valueChanged.connect(self.slider_listener)
 
+        # load and trace the models in background so that the first request runs at full speed
+        self.models_ready.connect(self.show_models_status)
+        self.warm_up_thread = threading.Thread(target=self.warm_up_models, daemon=True)
+        self.warm_up_thread.start()
+
 
         UIFunctions.selectStandardMenu(self, "btn_home")
         self.ui.stackedWidget.setCurrentWidget(self.ui.page_home)
@@ -98,222 +301,668 @@ class MainWindow(QMainWindow):
         self.show()
 
     # Add Salt-and-Pepper noise to an image.
+    # rng can be a seed or a numpy Generator to make the noise reproducible,
+    # rand is an already drawn uniform field of the image size,
+    # per_channel corrupts the channels of color images independently instead of whole pixels
     @staticmethod
-    def sp_noise(image, probability):
+    def sp_noise(image, probability, rng=None, rand=None, per_channel=False):
         output = np.copy(image)
-        x = 1 - probability
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                rand = random.random()
-                if rand < probability:
-                    if random.randint(0, 1) == 0:
-                        output[i][j] = 0
-                    else:
-                        output[i][j] = 255
-                elif rand > x:
-                    output[i][j] = image[i][j]
+
+        # one uniform draw in [-1, 1) per pixel (or per channel): pixels below probability in
+        # absolute value are corrupted, pepper when negative and salt when positive
+        if rand is None:
+            shape = image.shape if per_channel else image.shape[:2]
+            rand = np.random.default_rng(rng).uniform(-1, 1, shape)
+        corrupted = np.abs(rand) < probability
+        output[corrupted & (rand < 0)] = 0
+        output[corrupted & (rand >= 0)] = 255
         return output
 
     # Add gauss noise to an image.
+    # uint8 images are normalized to [0, 1] while the noise is added, the float32 result is
+    # written into out when given, rng can be a seed or a numpy Generator,
+    # noise is an already drawn standard normal field of the image size
     @staticmethod
-    def gauss_noise(image, probability):
+    def gauss_noise(image, probability, rng=None, out=None, noise=None):
+        if out is None:
+            out = np.empty(image.shape, dtype=np.float32)
+
         # generate noise
-        noise = np.random.normal(loc=0, scale=1, size=image.shape)
+        if noise is None:
+            np.random.default_rng(rng).standard_normal(dtype=np.float32, out=out)
+        else:
+            out[...] = noise
 
         # noise overlaid over image
-        result = np.clip((image + noise * probability), 0, 1)
+        if image.dtype == np.uint8:
+            out *= probability * 255
+            out += image
+            out *= 1 / 255
+        else:
+            out *= probability
+            out += image
+        np.clip(out, 0, 1, out=out)
+
+        return out
+
+    # Pad (height, width, channels) image matrix for AMF filter, padded values sort after every pixel value
+    @staticmethod
+    def _amf_pad(matrix, margin):
+        margins = ((margin, margin), (margin, margin), (0, 0))
+        if np.issubdtype(matrix.dtype, np.floating):
+            return np.pad(matrix, margins, constant_values=np.inf)
 
-        return result
+        dtype = np.int16 if matrix.dtype.itemsize == 1 else np.int64
+        return np.pad(matrix.astype(dtype), margins, constant_values=np.iinfo(dtype).max)
 
-    # Extract patch from image matrix form AMF filter
+    # Number of pixels inside the patches of the pixels, patches are clipped to the image borders
     @staticmethod
-    def _extract_patch(matrix, x, y, patch_size=3):
-        height, width = matrix.shape
+    def _amf_patch_length(shape, rows, cols, patch_size):
+        height, width = shape[:2]
         size = patch_size // 2
+        patch_height = np.minimum(rows + size, height - 1) - np.maximum(rows - size, 0) + 1
+        patch_width = np.minimum(cols + size, width - 1) - np.maximum(cols - size, 0) + 1
+        return patch_height * patch_width
 
-        # initialize x index
-        if x - size >= 0:
-            x_begin = x - size
-        else:
-            x_begin = 0
+    # Extract sorted patches of the pixels from padded image matrix for AMF filter
+    @staticmethod
+    def _amf_patches(padded, margin, rows, cols, chans, patch_size):
+        size = patch_size // 2
+        offsets = np.arange(-size, size + 1)
+        patches = padded[(rows + margin)[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis],
+                         (cols + margin)[:, np.newaxis, np.newaxis] + offsets,
+                         chans[:, np.newaxis, np.newaxis]]
+        return np.sort(patches.reshape(len(rows), patch_size * patch_size), axis=1)
+
+    # Integral histogram of each channel of an uint8 image region, counts wrap around
+    # in uint16 but their differences are exact for patches up to 255x255
+    @staticmethod
+    def _integral_histogram(region, bins):
+        height, width, channels = region.shape
+        integral = np.zeros((height + 1, width + 1, channels, bins), dtype=np.uint16)
+        integral[1:, 1:] = region[..., np.newaxis] == np.arange(bins, dtype=np.uint8)
+
+        # accumulate one row, then one column at a time, faster than np.cumsum on the 4D array
+        for i in range(1, height + 1):
+            integral[i] += integral[i - 1]
+        for j in range(1, width + 1):
+            integral[:, j] += integral[:, j - 1]
+        return integral
+
+    # Extract histograms of the patches of the pixels for AMF filter, image matrix must be uint8
+    # returns the flattened coarse (16 bins) and fine (256 bins) integral histograms with the patch corners
+    @staticmethod
+    def _amf_histograms(matrix, rows, cols, chans, patch_size):
+        height, width, channels = matrix.shape
+        size = patch_size // 2
+        top = max(rows.min() - size, 0)
+        left = max(cols.min() - size, 0)
+        region = matrix[top:min(rows.max() + size + 1, height), left:min(cols.max() + size + 1, width)]
+        coarse = MainWindow._integral_histogram(region >> 4, 16).ravel()
+        fine = MainWindow._integral_histogram(region, 256).ravel()
+
+        # flat index of the 4 corners of the clipped patches inside the integral histograms
+        patch_top = np.maximum(rows - size, 0) - top
+        patch_left = np.maximum(cols - size, 0) - left
+        patch_bottom = np.minimum(rows + size, height - 1) - top + 1
+        patch_right = np.minimum(cols + size, width - 1) - left + 1
+        stride = region.shape[1] + 1
+        corners = np.stack([patch_bottom * stride + patch_right, patch_top * stride + patch_left,
+                            patch_top * stride + patch_right, patch_bottom * stride + patch_left])
+        return coarse, fine, corners * channels + chans
+
+    # Histogram of 16 bins starting at first bin of each patch from the 4 corners of the patch
+    @staticmethod
+    def _amf_counts(integral, corners, bins, first=0):
+        index = (corners * bins + first)[..., np.newaxis] + np.arange(16)
+        counts = np.take(integral, index)
+        return counts[0] + counts[1] - counts[2] - counts[3]
 
-        if x + size < height:
-            x_end = x + size
-        else:
-            x_end = height - 1
+    # Extract value of given rank in each patch from its histograms, the coarse histogram
+    # gives the upper 4 bits of the value and the fine histogram the lower 4 bits
+    @staticmethod
+    def _amf_rank(histograms, rank):
+        coarse, fine, corners = histograms
+        index = np.arange(len(rank))
+
+        counts = MainWindow._amf_counts(coarse, corners, 16)
+        cumulative = np.cumsum(counts, axis=1)
+        high = np.argmax(cumulative > rank[:, np.newaxis], axis=1)
+        rank = rank - (cumulative[index, high] - counts[index, high])
 
-        # initialize y index
-        if y - size >= 0:
-            y_begin = y - size
+        counts = MainWindow._amf_counts(fine, corners, 256, high * 16)
+        low = np.argmax(np.cumsum(counts, axis=1) > rank[:, np.newaxis], axis=1)
+        return high * 16 + low
+
+    # Extract median (and min, max if extremes is set) value of the patches of the pixels
+    # source is the padded image matrix for the sort backend and the uint8 image matrix for the histogram backend
+    @staticmethod
+    def _amf_statistics(source, shape, margin, rows, cols, chans, patch_size, backend, extremes=False):
+        length = MainWindow._amf_patch_length(shape, rows, cols, patch_size)
+        if backend == "histogram":
+            histograms = MainWindow._amf_histograms(source, rows, cols, chans, patch_size)
+            patch_median = MainWindow._amf_rank(histograms, length // 2)
+            if not extremes:
+                return patch_median
+            patch_min = MainWindow._amf_rank(histograms, np.zeros_like(length))
+            patch_max = MainWindow._amf_rank(histograms, length - 1)
+        else:
+            patches = MainWindow._amf_patches(source, margin, rows, cols, chans, patch_size)
+            index = np.arange(len(rows))
+            patch_median = patches[index, length // 2]
+            if not extremes:
+                return patch_median
+            patch_min = patches[:, 0]
+            patch_max = patches[index, length - 1]
+        return patch_min, patch_max, patch_median
+
+    # Pixels of a block of the (height, width, channels) image matrix that are the min or the max of their 3x3 patch,
+    # the matrix is edge-padded by one pixel so that patches clipped at the borders keep their min and max
+    @staticmethod
+    def _amf_detect(padded, top, left, block):
+        region = padded[top:top + block + 2, left:left + block + 2]
+        height, width = region.shape[0] - 2, region.shape[1] - 2
+        views = [region[i:i + height, j:j + width] for i in range(3) for j in range(3)]
+        pixels = views[4]
+        return ~((np.minimum.reduce(views) < pixels) & (pixels < np.maximum.reduce(views)))
+
+    # Apply AMF filter to a group of corrupted pixels of the (height, width, channels) image matrix
+    @staticmethod
+    def _amf_pixels(matrix, output, source, margin, rows, cols, chans, max_patch_size, backend):
+        # extract median value of 3x3 patches
+        patch_size = 3
+        patch_median = MainWindow._amf_statistics(source, matrix.shape, margin, rows, cols, chans, patch_size, backend)
+
+        while len(rows) > 0:
+            # replace pixels whose median value is not corrupted
+            valid = (0 < patch_median) & (patch_median < 255)
+            output[rows[valid], cols[valid], chans[valid]] = patch_median[valid]
+            rows, cols, chans = rows[~valid], cols[~valid], chans[~valid]
+
+            # calculate new patch for the remaining pixels
+            patch_size = patch_size + 2
+            if patch_size > max_patch_size or len(rows) == 0:
+                break
+            patch_median = MainWindow._amf_statistics(source, matrix.shape, margin, rows, cols, chans,
+                                                      patch_size, backend)
+
+    # Adaptive median filter function, filters every channel of (height, width, channels) images
+    # sparse=True only filters impulse pixels (0 or 255), the other pixels are kept as they are
+    # backend "sort" sorts the patches, "histogram" uses histograms of uint8 values whose cost
+    # does not grow with max_patch_size
+    @staticmethod
+    def amf(matrix, max_patch_size=15, sparse=False, backend="sort"):
+        # prepare output, grayscale images are filtered as single channel images
+        output = np.copy(matrix)
+        if matrix.ndim == 2:
+            matrix = matrix[..., np.newaxis]
+        channels_output = output.reshape(matrix.shape)
+        height, width = matrix.shape[:2]
+        margin = max(max_patch_size, 3) // 2
+        if backend == "histogram":
+            source = matrix.astype(np.uint8)
+            if not np.array_equal(source, matrix):
+                raise ValueError("histogram backend only supports integer pixel values between 0 and 255")
         else:
-            y_begin = 0
+            source = MainWindow._amf_pad(matrix, margin)
 
-        if y + size < width:
-            y_end = y + size
+        # corrupted pixels are the impulse pixels when sparse, the min or max of their 3x3 patch otherwise,
+        # the 3x3 test runs on whole blocks of pixels and channels and only corrupted pixels are gathered
+        if sparse:
+            impulses = (matrix == 0) | (matrix == 255)
         else:
-            y_end = width - 1
+            padded = np.pad(matrix, ((1, 1), (1, 1), (0, 0)), mode="edge")
+
+        # filter blocks of pixels to bound the memory used by the extracted patches
+        block = 128
+        for top in range(0, height, block):
+            for left in range(0, width, block):
+                if sparse:
+                    corrupted = impulses[top:top + block, left:left + block]
+                else:
+                    corrupted = MainWindow._amf_detect(padded, top, left, block)
+                rows, cols, chans = np.nonzero(corrupted)
+                if len(rows) > 0:
+                    MainWindow._amf_pixels(matrix, channels_output, source, margin, rows + top, cols + left, chans,
+                                           max_patch_size, backend)
 
-        # loop inside patch
-        output = []
-        for i in range(x_begin, x_end + 1):
-            for j in range(y_begin, y_end + 1):
-                output.append(matrix[i][j])
         return output
 
-    # Adaptive median filter function
+    # Apply AMF filter to one tile of an image shared between processes
     @staticmethod
-    def amf(matrix, max_patch_size=15):
-        # prepare output
-        output = np.copy(matrix)
-        height, width = matrix.shape
-
-        for x in range(height):
-            for y in range(width):
-                patch_size = 3
-                patch = MainWindow._extract_patch(matrix, x, y, patch_size)
-
-                # extract min, max and median value of patch
-                patch_min = np.min(patch)
-                patch_max = np.max(patch)
-                patch.sort()
-                patch_median = patch[len(patch) // 2]
-
-                # check if pixel is corrupted
-                if patch_min < matrix[x][y] < patch_max:
-                    output[x][y] = matrix[x][y]
-                else:
-                    # check if median value is also corrupted
-                    finish = False
-                    while not finish:
-                        if 0 < patch_median < 255:
-                            output[x][y] = patch_median
-                            finish = True
-                        else:
-                            # calculate new patch
-                            patch_size = patch_size + 2
-                            if patch_size <= max_patch_size:
-                                patch = MainWindow._extract_patch(matrix, x, y, patch_size)
-                                patch.sort()
-                                patch_median = patch[len(patch) // 2]
-                            else:
-                                finish = True
+    def _amf_tile(task):
+        source_name, output_name, shape, dtype, tile, max_patch_size, sparse, backend = task
+        source_memory = shared_memory.SharedMemory(name=source_name)
+        output_memory = shared_memory.SharedMemory(name=output_name)
+        source = np.ndarray(shape, dtype=dtype, buffer=source_memory.buf)
+        output = np.ndarray(shape, dtype=dtype, buffer=output_memory.buf)
+
+        # extend tile with a halo so that patches are only clipped at the image borders
+        top, bottom, left, right = tile
+        halo = max(max_patch_size, 3) // 2
+        halo_top = max(top - halo, 0)
+        halo_left = max(left - halo, 0)
+        region = source[halo_top:min(bottom + halo, shape[0]), halo_left:min(right + halo, shape[1])]
+        filtered = MainWindow.amf(region, max_patch_size, sparse, backend)
+        output[top:bottom, left:right] = filtered[top - halo_top:bottom - halo_top, left - halo_left:right - halo_left]
+
+        # release views before closing shared memory
+        del source, output, region
+        source_memory.close()
+        output_memory.close()
+
+    # Adaptive median filter on tiles processed in parallel, same output as amf on the whole image
+    # workers is the number of processes (None for every CPU)
+    @staticmethod
+    def amf_tiled(matrix, max_patch_size=15, sparse=False, backend="sort", workers=None, tile_size=1024):
+        height, width = matrix.shape[:2]
+        source_memory = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        output_memory = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            # pixels are shared with the workers, only tile coordinates are sent to them
+            source = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=source_memory.buf)
+            source[...] = matrix
+            del source
+            tasks = [(source_memory.name, output_memory.name, matrix.shape, matrix.dtype.str,
+                      (top, min(top + tile_size, height), left, min(left + tile_size, width)),
+                      max_patch_size, sparse, backend)
+                     for top in range(0, height, tile_size) for left in range(0, width, tile_size)]
+            with ProcessPoolExecutor(workers) as executor:
+                list(executor.map(MainWindow._amf_tile, tasks))
+
+            output = np.array(np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=output_memory.buf))
+        finally:
+            source_memory.close()
+            source_memory.unlink()
+            output_memory.close()
+            output_memory.unlink()
 
         return output
 
-    # Extract patches from grayscale image with resize
+    # Unit noise field of an image drawn from a noise context
+    @staticmethod
+    def unit_noise(type_noise, shape, context):
+        rng = context.generator()
+        if type_noise == "gauss":
+            return rng.standard_normal(shape, dtype=np.float32)
+        else:
+            return 2 * rng.random(shape[:2], dtype=np.float32) - 1
+
+    # Regenerate noised image of an execution from its original image and recorded noise seed
+    @staticmethod
+    def regenerate_noised(folder_path):
+        with open(f"{folder_path}noise.json") as file:
+            metadata = json.load(file)
+        original_image = np.array(Image.open(f"{folder_path}original.png"))
+
+        field = MainWindow.unit_noise(metadata["type"], metadata["shape"], NoiseContext.from_seed(metadata["seed"]))
+        if metadata["type"] == "gauss":
+            noised_image = MainWindow.gauss_noise(original_image, metadata["intensity"], noise=field)
+            noised_image *= 255
+            return noised_image.astype(np.uint8)
+        else:
+            return MainWindow.sp_noise(original_image, metadata["intensity"], rand=field)
+
+    # Extract patches from grayscale image with reflect padding
     @staticmethod
     def extract_patches_gray(image, patch_size):
-        # resize image so that it's dimensions are dividable by patch_height and patch_width
-        h, w = image.shape
-        height = math.ceil(h / patch_size) * patch_size
-        width = math.ceil(w / patch_size) * patch_size
-        image = cv.resize(image, (height, width))
-
-        patches = tf.image.extract_patches(images=tf.expand_dims(image[:, :, np.newaxis], 0),
-                                           sizes=[1, patch_size, patch_size, 1],
-                                           strides=[1, patch_size, patch_size, 1],
-                                           rates=[1, 1, 1, 1],
-                                           padding='SAME')
-        _, x, y, _ = patches.shape
-        list = []
-        for imgs in patches:
-            for r in range(x):
-                for c in range(y):
-                    list.append(np.array(tf.reshape(imgs[r, c], shape=(patch_size, patch_size, 1))))
-        return list
+        # pad image so that it's dimensions are dividable by patch_size
+        image = MainWindow.pad_to_patches(image, patch_size)
+        patches, _ = MainWindow.batch_to_patches(image[np.newaxis, :, :, np.newaxis], patch_size)
+        return patches
+
+    # Non-overlapping patches of a (batch, height, width, ...) batch of images as a read-only
+    # (batch, rows, cols, patch_size, patch_size, ...) view of the images, the right and bottom remainders are dropped
+    @staticmethod
+    def batch_patch_grid(images, patch_size=64):
+        rows = images.shape[1] // patch_size
+        cols = images.shape[2] // patch_size
+        batch_stride, row_stride, col_stride = images.strides[:3]
+        return np.lib.stride_tricks.as_strided(
+            images,
+            shape=(images.shape[0], rows, cols, patch_size, patch_size) + images.shape[3:],
+            strides=(batch_stride, row_stride * patch_size, col_stride * patch_size, row_stride, col_stride)
+            + images.strides[3:],
+            writeable=False)
+
+    # Non-overlapping patches of a batch of images as one (batch * rows * cols, patch_size, patch_size, ...) batch,
+    # with the (image, row, col) position of every patch in the grid
+    @staticmethod
+    def batch_to_patches(images, patch_size=64):
+        grid = MainWindow.batch_patch_grid(images, patch_size)
+        index = np.indices(grid.shape[:3]).reshape(3, -1).T
+        return grid.reshape((-1,) + grid.shape[3:]), index
+
+    # Reconstruct a batch of images from the patches of a (batch, rows, cols) grid, patches are laid out
+    # image by image and row by row, or at their (image, row, col) position when an index is given
+    @staticmethod
+    def batch_from_patches(patches, grid_shape, index=None):
+        patches = np.asarray(patches)
+        batch, rows, cols = grid_shape
+        patch_height, patch_width = patches.shape[1:3]
+        channels = patches.shape[3:]
+
+        # write the (rows, cols, height, width) patches into the (rows, height, cols, width) images in one copy
+        output = np.empty((batch, rows * patch_height, cols * patch_width) + channels, dtype=patches.dtype)
+        grid = output.reshape((batch, rows, patch_height, cols, patch_width) + channels).swapaxes(2, 3)
+        if index is None:
+            grid[...] = patches.reshape((batch, rows, cols, patch_height, patch_width) + channels)
+        else:
+            grid[index[:, 0], index[:, 1], index[:, 2]] = patches
+        return output
+
+    # Non-overlapping patches of an image as a read-only (rows, cols, patch_size, patch_size, channels)
+    # view of the image, the right and bottom remainders are dropped
+    @staticmethod
+    def patch_grid(image, patch_size=64):
+        return MainWindow.batch_patch_grid(image[np.newaxis], patch_size)[0]
 
     # Extract patches from grayscale image without resize
     @staticmethod
     def image_to_patches_gray(image, patch_size=64):
-        W = image.shape[0]
-        H = image.shape[1]
-        if W < patch_size or H < patch_size:
-            return []
-
-        ret = []
-        for ws in range(0, W // patch_size):
-            for hs in range(0, H // patch_size):
-                patch = image[ws * patch_size: (ws + 1) * patch_size, hs * patch_size: (hs + 1) * patch_size]
-                ret.append(patch)
-        return ret
+        patches, _ = MainWindow.batch_to_patches(image[np.newaxis], patch_size)
+        return patches
 
     # Extract patches from rgb image without resize
     @staticmethod
     def image_to_patches(image, patch_size=64):
-        W = image.shape[0]
-        H = image.shape[1]
-        if W < patch_size or H < patch_size:
-            return []
-
-        ret = []
-        for ws in range(0, W // patch_size):
-            for hs in range(0, H // patch_size):
-                patch = image[ws * patch_size: (ws + 1) * patch_size, hs * patch_size: (hs + 1) * patch_size]
-                ret.append(patch)
-        return ret
-
-    # Reconstruct image from patches
-    @staticmethod
-    def reconstruct_patches(patches):
-        hstack = []
-        count = 0
-        for patch in patches:
-            if count == 0:
-                stack = patch
-                count += 1
-            elif count < math.sqrt(len(patches)):
-                stack = np.hstack((stack, patch))
-                count += 1
-            else:
-                hstack.append(stack)
-                count = 1
-                stack = patch
-        hstack.append(stack)
-        if math.sqrt(len(patches)).is_integer():
-            count = 0
-            for stack in hstack:
-                if count == 0:
-                    vstack = stack
-                else:
-                    vstack = np.vstack((vstack, stack))
-                count += 1
-        else:
-            count = 0
-            for stack in hstack:
-                if count == 0:
-                    vstack = stack
-                else:
-                    vstack = np.hstack((vstack, stack))
-                count += 1
-        return vstack
+        patches, _ = MainWindow.batch_to_patches(image[np.newaxis], patch_size)
+        return patches
+
+    # Non-overlapping patches of an image padded as given by it's grid, reflected or with mode of np.pad
+    @staticmethod
+    def grid_patches(image, grid, mode="reflect"):
+        return MainWindow.image_to_patches(MainWindow.pad_to_grid(image, grid, mode), grid.patch_size)
+
+    # Pad the bottom and right borders of an image by the padding of it's grid, reflected or with mode of np.pad
+    @staticmethod
+    def pad_to_grid(image, grid, mode="reflect"):
+        if not any(grid.padding):
+            return image
+        padding = ((0, grid.padding[0]), (0, grid.padding[1])) + ((0, 0),) * (image.ndim - 2)
+        return np.pad(image, padding, mode=mode)
+
+    # Non-overlapping patches covering a whole image reflect-padded to whole patches, with their grid
+    @staticmethod
+    def image_patches(image, patch_size=64):
+        grid = PatchGrid.covering(image.shape, patch_size)
+        return MainWindow.grid_patches(image, grid), grid
+
+    # Reflect the right and bottom borders of an image so that it's dimensions are dividable by patch_size
+    @staticmethod
+    def pad_to_patches(image, patch_size=64):
+        height, width = image.shape[:2]
+        padding = ((0, -height % patch_size), (0, -width % patch_size)) + ((0, 0),) * (image.ndim - 2)
+        if not any(after for _, after in padding):
+            return image
+        return np.pad(image, padding, mode="reflect")
+
+    # Reconstruct image from patches laid out row by row on a (rows, cols) grid, the image is cropped
+    # to its size when the grid is a PatchGrid, without grid the grid is square when possible
+    # and a single row of patches otherwise
+    @staticmethod
+    def reconstruct_patches(patches, grid=None):
+        patches = np.asarray(patches)
+        if isinstance(grid, PatchGrid):
+            image = MainWindow.batch_from_patches(patches, (1, grid.rows, grid.cols))[0]
+            return image[:grid.image_shape[0], :grid.image_shape[1]]
+        if grid is None:
+            side = math.isqrt(len(patches))
+            grid = (side, side) if side * side == len(patches) else (1, len(patches))
+        return MainWindow.batch_from_patches(patches, (1,) + tuple(grid))[0]
+
+    # Distinct patches of a batch and the index of every patch in them, patches are compared on their raw bytes,
+    # patch counts and the fraction of patches found as duplicates are accumulated in stats
+    @staticmethod
+    def unique_patches(patches, stats=None):
+        patches = np.ascontiguousarray(patches)
+        rows = patches.reshape(len(patches), int(np.prod(patches.shape[1:])))
+        keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        if stats is not None:
+            stats["patches"] = stats.get("patches", 0) + len(patches)
+            stats["unique_patches"] = stats.get("unique_patches", 0) + len(first)
+            stats["dedup_hit_rate"] = (stats["patches"] - stats["unique_patches"]) / max(stats["patches"], 1)
+        return patches[first], inverse.ravel()
+
+    # Patches with a variance below threshold, counts and the fraction of bypassed patches are accumulated in stats
+    @staticmethod
+    def low_variance_patches(patches, threshold, stats=None):
+        bypassed = patches.reshape(len(patches), int(np.prod(patches.shape[1:]))).var(axis=1) < threshold
+        if stats is not None:
+            stats["bypass_patches"] = stats.get("bypass_patches", 0) + len(patches)
+            stats["bypassed_patches"] = stats.get("bypassed_patches", 0) + int(np.count_nonzero(bypassed))
+            stats["bypass_rate"] = stats["bypassed_patches"] / max(stats["bypass_patches"], 1)
+        return bypassed
+
+    # Smooth every patch with the 5x5 gaussian filter of the baseline images
+    @staticmethod
+    def blur_patches(patches):
+        output = np.empty(patches.shape, dtype=np.float32)
+        for i, patch in enumerate(patches):
+            output[i] = cv.GaussianBlur(np.float32(patch), (5, 5), 0).reshape(patch.shape)
+        return output
+
+    # Compiled inference function of every model, built on first use
+    inference_functions = {}
+
+    # Number of traces of the compiled inference functions, increased each time one of them is traced
+    retrace_count = 0
+
+    # Lock of the compiled functions and of the trace count, shared by the warm-up thread and the GUI thread
+    inference_lock = threading.Lock()
+
+    # Count a trace of a compiled inference function
+    @staticmethod
+    def count_trace():
+        with MainWindow.inference_lock:
+            MainWindow.retrace_count += 1
+
+    # Compiled inference function of a model, only the batch dimension of it's input is dynamic
+    # so that the function is traced once whatever the number of patches
+    @staticmethod
+    def inference_function(model):
+        with MainWindow.inference_lock:
+            function = MainWindow.inference_functions.get(model)
+            if function is None:
+                signature = [tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32)]
+
+                # python code of the function only runs while tracing
+                def inference(batch):
+                    MainWindow.count_trace()
+                    return model(batch, training=False)
+                function = tf.function(inference, input_signature=signature)
+                MainWindow.inference_functions[model] = function
+            return function
+
+    # Layers that accept inputs of any height and width, convolutions only with same padding and without dilation
+    shape_agnostic_layers = {"InputLayer", "Conv2D", "Conv2DTranspose", "Activation", "Add", "Concatenate"}
+
+    # Whether a layer accepts inputs of any height and width
+    @staticmethod
+    def shape_agnostic(layer):
+        if type(layer).__name__ not in MainWindow.shape_agnostic_layers:
+            return False
+        if type(layer).__name__ in ("Conv2D", "Conv2DTranspose"):
+            return layer.padding == "same" and tuple(layer.dilation_rate) == (1, 1)
+        return True
+
+    # Receptive field radius in pixels of a fully convolutional model, every convolution sees (kernel - 1) / 2
+    # pixels around it at the scale of the strides of the convolutions before it
+    @staticmethod
+    def receptive_radius(model):
+        radius, scale = 0, 1
+        for layer in model.layers:
+            if type(layer).__name__ == "Conv2D":
+                radius += (max(layer.kernel_size) - 1) // 2 * scale
+                scale *= layer.strides[0]
+            elif type(layer).__name__ == "Conv2DTranspose":
+                radius += (max(layer.kernel_size) - 1) // 2 * scale
+                scale = max(scale // layer.strides[0], 1)
+        return radius
+
+    # Whole-image inference function of every model, the multiple it's input sizes must be aligned on
+    # and the halo of context around a tile, None for models that are not fully convolutional
+    whole_image_functions = {}
+
+    # Whole-image inference function of a model, the model is rebuilt from it's config with any input height
+    # and width when all of it's layers are shape-agnostic, the input is aligned on the product of it's strides
+    # and tiles see the receptive field of the model around them, rounded up to the alignment
+    @staticmethod
+    def whole_image_function(model):
+        with MainWindow.inference_lock:
+            if model in MainWindow.whole_image_functions:
+                return MainWindow.whole_image_functions[model]
+
+            function = None
+            if all(MainWindow.shape_agnostic(layer) for layer in model.layers):
+                config = model.get_config()
+                for layer in config["layers"]:
+                    for key in ("batch_input_shape", "batch_shape"):
+                        if layer["class_name"] == "InputLayer" and key in layer["config"]:
+                            shape = layer["config"][key]
+                            layer["config"][key] = (shape[0], None, None, shape[-1])
+                whole_model = tf.keras.Model.from_config(config)
+                whole_model.set_weights(model.get_weights())
+                alignment = int(np.prod([layer.strides[0] for layer in model.layers
+                                         if type(layer).__name__ == "Conv2D"]))
+                halo = -(-MainWindow.receptive_radius(model) // alignment) * alignment
+                signature = [tf.TensorSpec((None, None, None, model.input_shape[-1]), tf.float32)]
+
+                def inference(batch):
+                    MainWindow.count_trace()
+                    return whole_model(batch, training=False)
+                function = (tf.function(inference, input_signature=signature), alignment, halo)
+            MainWindow.whole_image_functions[model] = function
+            return function
+
+    # image prediction of a whole (height, width, channels) image with a fully convolutional model, the image is
+    # predicted by tiles of tile_size with the halo of the model around them to bound memory,
+    # without tile_size it's predicted at once
+    @staticmethod
+    def predict_whole(noised_image, model, tile_size=1024):
+        function, alignment, halo = MainWindow.whole_image_function(model)
+        height, width, channels = noised_image.shape
+        tile_size = -(-(tile_size or max(height, width)) // alignment) * alignment
+
+        output = np.empty((height, width, channels), dtype=np.float32)
+        for row in range(0, height, tile_size):
+            for col in range(0, width, tile_size):
+                top, left = max(row - halo, 0), max(col - halo, 0)
+                bottom, right = min(row + tile_size, height), min(col + tile_size, width)
+                tile = noised_image[top:min(bottom + halo, height), left:min(right + halo, width)]
+                tile = MainWindow.pad_to_patches(np.float32(tile), alignment)
+                prediction = np.asarray(function(tile[np.newaxis]))[0]
+                output[row:bottom, col:right] = prediction[row - top:bottom - top, col - left:right - left]
+        return output
+
+    # Auto-encoder prediction of a batch of patches, patches go through the compiled model by batches of batch_size,
+    # patches with a variance below bypass_threshold are blurred instead of predicted,
+    # with dedup identical patches are predicted once
+    @staticmethod
+    def predict_patches(patches, model, batch_size=32, dedup=False, bypass_threshold=0.0, stats=None):
+        patches = np.asarray(patches)
+        if bypass_threshold > 0:
+            bypassed = MainWindow.low_variance_patches(patches, bypass_threshold, stats)
+            output = np.empty(patches.shape, dtype=np.float32)
+            output[bypassed] = MainWindow.blur_patches(patches[bypassed])
+            output[~bypassed] = MainWindow.predict_patches(patches[~bypassed], model, batch_size, dedup, stats=stats)
+            return output
+        if dedup:
+            patches, inverse = MainWindow.unique_patches(patches, stats)
+            return MainWindow.predict_patches(patches, model, batch_size, stats=stats)[inverse]
+
+        function = MainWindow.inference_function(model)
+        start_time = time.perf_counter()
+        output = np.empty(patches.shape, dtype=np.float32)
+        for start in range(0, len(patches), batch_size):
+            output[start:start + batch_size] = function(np.float32(patches[start:start + batch_size]))
+
+        if stats is not None:
+            stats["predicted_patches"] = stats.get("predicted_patches", 0) + len(patches)
+            stats["predict_time"] = stats.get("predict_time", 0.0) + time.perf_counter() - start_time
+            stats["patches_per_second"] = stats["predicted_patches"] / max(stats["predict_time"], 1e-9)
+        return output
 
     # image prediction from auto-encoder de-noising
     @staticmethod
-    def predict(noised_patches, model):
-        patches = []
-        for patch in noised_patches:
-            patch = tf.expand_dims(patch, axis=0)
-            patches.append(model.predict(patch)[0])
-        return MainWindow.reconstruct_patches(patches)
+    def predict(noised_patches, model, grid=None, dedup=False, stats=None, bypass_threshold=0.0, batch_size=32):
+        patches = MainWindow.predict_patches(noised_patches, model, batch_size, dedup, bypass_threshold, stats)
+        return MainWindow.reconstruct_patches(patches, grid)
+
+    # Blending window of an overlapping tile, highest at the center and positive up to the borders
+    @staticmethod
+    def tile_weights(patch_size):
+        window = np.hanning(patch_size + 2)[1:-1].astype(np.float32)
+        return np.outer(window, window)[..., np.newaxis]
+
+    # image prediction from the overlapping tiles of a grid of a (height, width, channels) image,
+    # the predictions are blended with the tile weights to hide the seams between tiles
+    # and cropped back to the image size
+    @staticmethod
+    def predict_overlap(noised_image, model, grid, batch_size=32, dedup=False, stats=None, bypass_threshold=0.0):
+        noised_image = MainWindow.pad_to_grid(noised_image, grid)
+        height, width, channels = noised_image.shape
+        patch_size = grid.patch_size
+        rows, cols = grid.positions()
+
+        # accumulate weighted tiles and weights, each pixel is the weighted mean of the tiles covering it
+        weights = MainWindow.tile_weights(patch_size)
+        output = np.zeros((height, width, channels), dtype=np.float32)
+        total = np.zeros((height, width, 1), dtype=np.float32)
+
+        # tiles are gathered batch by batch from a view of every patch_size window of the image
+        # so that memory is bounded by one batch of tiles
+        windows = np.lib.stride_tricks.sliding_window_view(noised_image, (patch_size, patch_size), axis=(0, 1))
+        tile_rows, tile_cols = np.repeat(rows, len(cols)), np.tile(cols, len(rows))
+        for start in range(0, len(tile_rows), batch_size):
+            batch_rows, batch_cols = tile_rows[start:start + batch_size], tile_cols[start:start + batch_size]
+            tiles = np.moveaxis(windows[batch_rows, batch_cols], 1, -1)
+            predictions = MainWindow.predict_patches(tiles, model, batch_size, dedup, bypass_threshold, stats)
+            for row, col, prediction in zip(batch_rows, batch_cols, predictions):
+                output[row:row + patch_size, col:col + patch_size] += prediction * weights
+                total[row:row + patch_size, col:col + patch_size] += weights
+        output /= total
+        return output[:grid.image_shape[0], :grid.image_shape[1]]
+
+    # Stride between denoising tiles for the configured patch overlap
+    def patch_stride(self, patch_size):
+        return max(1, patch_size - int(round(patch_size * self.patch_overlap)))
+
+    # image prediction of a (height, width, channels) image of any size on a covering patch grid,
+    # the prediction is cropped back to the image size, fully convolutional models predict the whole image
+    # in whole image mode
+    def predict_image(self, noised_image, model, grid):
+        if self.whole_image and MainWindow.whole_image_function(model) is not None:
+            return MainWindow.predict_whole(noised_image, model, self.whole_image_tile_size)
+        if self.patch_overlap > 0:
+            overlap_grid = PatchGrid(grid.image_shape, grid.patch_size, self.patch_stride(grid.patch_size),
+                                     grid.padding)
+            return MainWindow.predict_overlap(noised_image, model, overlap_grid, self.predict_batch_size,
+                                              self.patch_dedup, self.run_stats, self.bypass_threshold)
+        return MainWindow.predict(MainWindow.grid_patches(noised_image, grid), model, grid, self.patch_dedup,
+                                  self.run_stats, self.bypass_threshold, self.predict_batch_size)
+
+    # Patch grid of the PSNR of an image, patches of the auto-encoder of the noise type
+    def psnr_grid(self, image_shape):
+        return PatchGrid.covering(image_shape, PATCH_SIZES["sp" if self.type_noise == "sp" else "gauss"])
 
     # calculate PSNR
-    def calculate_psnr(self, image1, image2):
-        if self.type_noise == "gauss":
-            if self.type_img == "RGB":
-                image1_patches = MainWindow.image_to_patches(image1, 64)
-                image2_patches = MainWindow.image_to_patches(image2, 64)
-            else:
-                image1_patches = MainWindow.image_to_patches_gray(image1, 64)
-                image2_patches = MainWindow.image_to_patches_gray(image2, 64)
-        else:
-            image1_patches = MainWindow.image_to_patches_gray(image1, 40)
-            image2_patches = MainWindow.image_to_patches_gray(image2, 40)
+    def calculate_psnr(self, image1, image2, grid=None):
+        if grid is None:
+            grid = self.psnr_grid(image1.shape)
 
-        psnr = 0
-        for i in range(len(image1_patches)):
-            psnr += cv.PSNR(image1_patches[i], image2_patches[i])
+        # PSNR of every patch as cv.PSNR with a peak value of 255, on the pixels of the image only,
+        # the padding of the grid is zero and left out of the pixel count
+        squared = (np.asarray(image1, dtype=np.float64) - np.asarray(image2, dtype=np.float64)) ** 2
+        squared_patches = MainWindow.grid_patches(squared, grid, "constant")
+        counts = MainWindow.grid_patches(np.ones(squared.shape, dtype=np.float32), grid, "constant")
+        axis = tuple(range(1, squared_patches.ndim))
+        rmse = np.sqrt(squared_patches.sum(axis=axis) / counts.sum(axis=axis))
+        psnr = 20 * np.log10(255 / (rmse + np.finfo(np.float64).eps))
 
-        return psnr / len(image1_patches)
+        return psnr.mean()
 
     # Save image
     def save_image(self, image, directory, file_name):
@@ -334,10 +983,10 @@ class MainWindow(QMainWindow):
     def gray_predict(self):
         # load model
         class_names = ['gauss', 'none', 'sp']
-        model = models.load_model('./models/noise_classification_gray.model')
+        model = model_registry.get("noise_classification_gray")
 
         # loading & normalization of test image
-        image_path = f"{self.folder_path}noised.png"
+        image_path = self.noised_file()
         target_size = (64, 64)
         image = tf.keras.preprocessing.image.load_img(image_path, color_mode="grayscale", target_size=target_size)
         image = tf.keras.preprocessing.image.img_to_array(image)
@@ -345,7 +994,7 @@ class MainWindow(QMainWindow):
         image = tf.expand_dims(image, axis=0)
 
         # predict type of noise
-        prediction = model.predict(image)
+        prediction = MainWindow.inference_function(model)(image)
         noise = class_names[np.argmax(prediction)]
         self.ui.checkBox_noise_rand.setChecked(False)
         self.ui.checkBox_noise_sp.setChecked(False)
@@ -365,10 +1014,10 @@ class MainWindow(QMainWindow):
     def color_predict(self):
         # load model
         class_names = ['gauss', 'none']
-        model = models.load_model('./models/noise_classification_color.model')
+        model = model_registry.get("noise_classification_color")
 
         # loading & normalization of test image
-        image_path = f"{self.folder_path}noised.png"
+        image_path = self.noised_file()
         target_size = (64, 64)
         image = tf.keras.preprocessing.image.load_img(image_path, color_mode="rgb", target_size=target_size)
         image = tf.keras.preprocessing.image.img_to_array(image)
@@ -376,7 +1025,7 @@ class MainWindow(QMainWindow):
         image = tf.expand_dims(image, axis=0)
 
         # predict type of noise
-        prediction = model.predict(image)
+        prediction = MainWindow.inference_function(model)(image)
         noise = class_names[np.argmax(prediction)]
         self.ui.checkBox_noise_rand.setChecked(False)
         self.ui.checkBox_noise_sp.setChecked(False)
@@ -389,6 +1038,25 @@ class MainWindow(QMainWindow):
         else:
             pass
 
+    # Load every model and run one dummy batch through it at it's input shape, models that fail are reported
+    def warm_up_models(self):
+        failed = []
+        for name, shape in MODEL_INPUT_SHAPES.items():
+            try:
+                model = model_registry.get(name)
+                MainWindow.inference_function(model)(np.zeros((1,) + shape, dtype=np.float32))
+            except Exception as error:
+                print(f"warm-up of model {name} failed: {error}")
+                failed.append(name)
+        self.models_ready.emit(failed)
+
+    # Show in the title bar whether the models are ready or which of them failed to load
+    def show_models_status(self, failed):
+        if failed:
+            UIFunctions.labelDescription(self, f"AI - Denoise (models failed: {', '.join(failed)})")
+        else:
+            UIFunctions.labelDescription(self, 'AI - Denoise (models ready)')
+
     # Display Alert box
     def alert(self, title, context):
         dlg = QMessageBox(self)
@@ -410,7 +1078,7 @@ class MainWindow(QMainWindow):
             self.ui.image_noised.setPixmap(self.folder_path + "noised.png")
 
         # check image type
-        img = Image.open(f"{self.folder_path}noised.png")
+        img = Image.open(self.noised_file())
         color_mode = img.mode
         self.ui.checkBox_type_rand.setChecked(False)
         self.ui.checkBox_type_gray.setChecked(False)
@@ -454,23 +1122,41 @@ class MainWindow(QMainWindow):
                 # display error: image doesn't contain any noise
                 self.alert("Image Denoising", "Image doesn't contain any noise!")
 
+    # Gauss noise of the auto-encoder input, drawn from a child stream of the noise context of the image
+    # and recorded with it's intensity in noise.json next to the seed of the noised image
+    def model_noise(self, original_image, intensity):
+        if self.image_noise_context is None:
+            self.image_noise_context = self.noise_context.spawn(1)[0]
+        context = self.image_noise_context.child(0)
+
+        metadata = {}
+        if os.path.isfile(f"{self.folder_path}noise.json"):
+            with open(f"{self.folder_path}noise.json") as file:
+                metadata = json.load(file)
+        metadata["model_noise"] = {"intensity": intensity, "seed": context.seed()}
+        with open(f"{self.folder_path}noise.json", "w") as file:
+            json.dump(metadata, file)
+
+        return MainWindow.gauss_noise(original_image, intensity, rng=context.generator())
+
     # loading auto-encoder model
     def load_model(self, model_key=1):
+        self.run_stats = {}
+
         # load original & noised images
         original_path = f"{self.folder_path}original.png"
         original_image = tf.keras.preprocessing.image.load_img(original_path, color_mode=self.type_img)
         original_image = tf.keras.preprocessing.image.img_to_array(original_image)
 
-        noised_path = f"{self.folder_path}noised.png"
-        noised_image = tf.keras.preprocessing.image.load_img(noised_path, color_mode=self.type_img)
+        noised_image = tf.keras.preprocessing.image.load_img(self.noised_file(), color_mode=self.type_img)
         noised_image = tf.keras.preprocessing.image.img_to_array(noised_image)
 
         # load color gaussian de-noising auto-encoder
         if model_key == 1:
-            model = models.load_model('./models/G-COLOR.model')
+            model = model_registry.get("G-COLOR")
             original_image = original_image / 255.0
             noised_image = noised_image / 255.0
-            patch_size = 64
+            patch_size = PATCH_SIZES["gauss"]
 
             intensity = self.noise_intensity
             if self.noise_intensity >= 0.35:
@@ -481,19 +1167,21 @@ class MainWindow(QMainWindow):
             if self.noise_intensity == 0.0:
                 noisy_image = noised_image
             else:
-                noisy_image = self.gauss_noise(original_image, intensity)
+                noisy_image = self.model_noise(original_image, intensity)
 
-            prediction = MainWindow.predict(MainWindow.image_to_patches(np.array(noisy_image), patch_size), model)
+            grid = PatchGrid.covering(noisy_image.shape, patch_size)
+            prediction = self.predict_image(np.array(noisy_image), model, grid)
             prediction_image = (prediction * 255).clip(0, 255).astype(int)
-            original_image = (MainWindow.reconstruct_patches(MainWindow.image_to_patches(original_image, patch_size)) * 255).astype(int)
-            noised_image = (MainWindow.reconstruct_patches(MainWindow.image_to_patches(noised_image, patch_size)) * 255).astype(int)
+            original_image = (original_image * 255).astype(int)
+            noised_image = (noised_image * 255).astype(int)
             median5_image = cv.medianBlur(np.uint8(noised_image), 5)
             average_image = cv.blur(np.uint8(noised_image), (5, 5))
             gaussian_image = cv.GaussianBlur(np.uint8(noised_image), (5, 5), 0)
 
             self.save_image((original_image).astype(int), self.folder_path, "original")
             self.save_image((prediction_image).astype(int), self.folder_path, "auto-encoder")
-            self.save_image((noised_image).astype(int), self.folder_path, "noised")
+            if self.store_noised:
+                self.save_image((noised_image).astype(int), self.folder_path, "noised")
             self.save_image(median5_image, self.folder_path, "median5")
             self.save_image(average_image, self.folder_path, "average")
             self.save_image(gaussian_image, self.folder_path, "gaussian")
@@ -501,7 +1189,7 @@ class MainWindow(QMainWindow):
             # change name of execution folder
             now = datetime.now()
             dt_string = now.strftime("%d-%m-%Y %H-%M-%S")
-            image_size = f"{np.array(prediction_image).shape[0]}x{np.array(prediction_image).shape[0]}"
+            image_size = grid.size_label()
             noise_intensity = str(int(self.noise_intensity * 100))
             new_path = f"./history/{dt_string}+{image_size}+RGB+Gaussian+{noise_intensity}/"
             os.rename(self.folder_path, new_path)
@@ -509,10 +1197,10 @@ class MainWindow(QMainWindow):
 
         # load gray gaussian de-noising auto-encoder
         elif model_key == 2:
-            model = models.load_model('./models/G-GRAY.model')
+            model = model_registry.get("G-GRAY")
             original_image = original_image / 255.0
             noised_image = noised_image / 255.0
-            patch_size = 64
+            patch_size = PATCH_SIZES["gauss"]
 
             intensity = self.noise_intensity
             if self.noise_intensity >= 0.35:
@@ -523,19 +1211,21 @@ class MainWindow(QMainWindow):
             if self.noise_intensity == 0.0:
                 noisy_image = noised_image
             else:
-                noisy_image = self.gauss_noise(original_image, intensity)
+                noisy_image = self.model_noise(original_image, intensity)
 
-            prediction = MainWindow.predict(MainWindow.image_to_patches(np.array(noisy_image), patch_size), model)
+            grid = PatchGrid.covering(noisy_image.shape, patch_size)
+            prediction = self.predict_image(np.array(noisy_image), model, grid)
             prediction_image = (prediction * 255).astype(int)
-            original_image = (MainWindow.reconstruct_patches(MainWindow.image_to_patches(original_image[..., 0], patch_size)) * 255).astype(int)
-            noised_image = (MainWindow.reconstruct_patches(MainWindow.image_to_patches(noised_image[..., 0], patch_size)) * 255).astype(int)
+            original_image = (original_image[..., 0] * 255).astype(int)
+            noised_image = (noised_image[..., 0] * 255).astype(int)
             median5_image = cv.medianBlur(np.float32(noised_image), 5)
             average_image = cv.blur(np.float32(noised_image), (5, 5))
             gaussian_image = cv.GaussianBlur(np.float32(noised_image), (5, 5), 0)
 
             self.save_image(np.array(original_image).astype(int), self.folder_path, "original")
             self.save_image(np.array(prediction_image[..., 0]).astype(int), self.folder_path, "auto-encoder")
-            self.save_image(np.array(noised_image).astype(int), self.folder_path, "noised")
+            if self.store_noised:
+                self.save_image(np.array(noised_image).astype(int), self.folder_path, "noised")
             self.save_image(median5_image, self.folder_path, "median5")
             self.save_image(average_image, self.folder_path, "average")
             self.save_image(gaussian_image, self.folder_path, "gaussian")
@@ -543,7 +1233,7 @@ class MainWindow(QMainWindow):
             # change name of execution folder
             now = datetime.now()
             dt_string = now.strftime("%d-%m-%Y %H-%M-%S")
-            image_size = f"{np.array(prediction_image).shape[0]}x{np.array(prediction_image).shape[0]}"
+            image_size = grid.size_label()
             noise_intensity = str(int(self.noise_intensity * 100))
             new_path = f"./history/{dt_string}+{image_size}+GRAY+Gaussian+{noise_intensity}/"
             os.rename(self.folder_path, new_path)
@@ -551,19 +1241,19 @@ class MainWindow(QMainWindow):
 
         # load gray salt & pepper de-noising auto-encoder & AMF filter
         elif model_key == 3:
-            model = models.load_model('./models/S-GRAY.model')
-            patch_size = 40
+            model = model_registry.get("S-GRAY")
+            patch_size = PATCH_SIZES["sp"]
             filtred_image = tf.expand_dims(MainWindow.amf(noised_image[...,0]), -1)
-            prediction_image = MainWindow.predict(np.float32(MainWindow.extract_patches_gray(np.array(filtred_image[..., 0]) / 255, patch_size)), model)
-            original_image = MainWindow.reconstruct_patches(MainWindow.extract_patches_gray(np.array(original_image[..., 0]), patch_size))
-            amf_image = MainWindow.reconstruct_patches(MainWindow.extract_patches_gray(np.array(filtred_image[..., 0]), patch_size))
-            noised_image = MainWindow.reconstruct_patches(MainWindow.extract_patches_gray(np.array(noised_image[..., 0]), patch_size))
+            grid = PatchGrid.covering(filtred_image.shape, patch_size)
+            prediction_image = self.predict_image(np.float32(filtred_image) / 255, model, grid)
+            amf_image = np.array(filtred_image)
             median3_image = cv.medianBlur(noised_image, 3)
             median5_image = cv.medianBlur(noised_image, 5)
 
             self.save_image(np.array(original_image)[..., 0].astype(int), self.folder_path, "original")
             self.save_image((np.array(prediction_image)[..., 0] * 255).astype(int), self.folder_path, "auto-encoder")
-            self.save_image(np.array(noised_image)[..., 0].astype(int), self.folder_path, "noised")
+            if self.store_noised:
+                self.save_image(np.array(noised_image)[..., 0].astype(int), self.folder_path, "noised")
             self.save_image(median5_image, self.folder_path, "median5")
             self.save_image(median3_image, self.folder_path, "median3")
             self.save_image(np.array(amf_image)[..., 0].astype(int), self.folder_path, "median_Filter")
@@ -571,12 +1261,16 @@ class MainWindow(QMainWindow):
             # change name of execution folder
             now = datetime.now()
             dt_string = now.strftime("%d-%m-%Y %H-%M-%S")
-            image_size = f"{np.array(prediction_image).shape[0]}x{np.array(prediction_image).shape[0]}"
+            image_size = grid.size_label()
             noise_intensity = str(int(self.noise_intensity * 100))
             new_path = f"./history/{dt_string}+{image_size}+GRAY+Salt & pepper+{noise_intensity}/"
             os.rename(self.folder_path, new_path)
             self.folder_path = new_path
 
+        # report statistics of the de-noising run
+        if self.run_stats:
+            print(self.run_stats)
+
     # Display de-noising result images for gaussian noise
     def display_gauss_images(self):
         # load images
@@ -586,15 +1280,13 @@ class MainWindow(QMainWindow):
         original_image = tf.keras.preprocessing.image.img_to_array(original_image).astype(int)
         if self.type_img == "grayscale":
             original_image = original_image[..., 0]
-        original_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(original_image, 64))
+        grid = self.psnr_grid(original_image.shape)
 
         # noised image
-        image_path = f"{self.folder_path}noised.png"
-        noised_image = tf.keras.preprocessing.image.load_img(image_path, color_mode=self.type_img)
+        noised_image = tf.keras.preprocessing.image.load_img(self.noised_file(), color_mode=self.type_img)
         noised_image = tf.keras.preprocessing.image.img_to_array(noised_image).astype(int)
         if self.type_img == "grayscale":
             noised_image = noised_image[..., 0]
-        noised_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(noised_image, 64))
 
         # de-noised image
         image_path = f"{self.folder_path}auto-encoder.png"
@@ -602,7 +1294,6 @@ class MainWindow(QMainWindow):
         denoised_image = tf.keras.preprocessing.image.img_to_array(denoised_image).astype(int)
         if self.type_img == "grayscale":
             denoised_image = denoised_image[..., 0]
-        denoised_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(denoised_image, 64))
 
         # gaussian image
         image_path = f"{self.folder_path}gaussian.png"
@@ -610,7 +1301,6 @@ class MainWindow(QMainWindow):
         gaussian_image = tf.keras.preprocessing.image.img_to_array(gaussian_image).astype(int)
         if self.type_img == "grayscale":
             gaussian_image = gaussian_image[..., 0]
-        gaussian_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(gaussian_image, 64))
 
         # average image
         image_path = f"{self.folder_path}average.png"
@@ -618,7 +1308,6 @@ class MainWindow(QMainWindow):
         average_image = tf.keras.preprocessing.image.img_to_array(average_image).astype(int)
         if self.type_img == "grayscale":
             average_image = average_image[..., 0]
-        average_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(average_image, 64))
 
         # median 5x5 image
         image_path = f"{self.folder_path}median5.png"
@@ -626,7 +1315,6 @@ class MainWindow(QMainWindow):
         median5_image = tf.keras.preprocessing.image.img_to_array(median5_image).astype(int)
         if self.type_img == "grayscale":
             median5_image = median5_image[..., 0]
-        median5_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(median5_image, 64))
 
         # display images with matplotlib
         fig = plt.figure(figsize=(20, 20))
@@ -641,7 +1329,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 2)
         plt.imshow(noised_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(noised_image, original_image)
+        psnr = self.calculate_psnr(noised_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"NOISED \n PSNR = {psnr}")
@@ -649,7 +1337,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 3)
         plt.imshow(denoised_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(denoised_image, original_image)
+        psnr = self.calculate_psnr(denoised_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"DENOISED \n PSNR = {psnr}")
@@ -657,7 +1345,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 4)
         plt.imshow(gaussian_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(gaussian_image, original_image)
+        psnr = self.calculate_psnr(gaussian_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"GAUSSIAN \n PSNR = {psnr}")
@@ -665,7 +1353,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 5)
         plt.imshow(average_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(average_image, original_image)
+        psnr = self.calculate_psnr(average_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"AVERAGE \n PSNR = {psnr}")
@@ -673,7 +1361,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 6)
         plt.imshow(median5_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(median5_image, original_image)
+        psnr = self.calculate_psnr(median5_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"MEDIAN 5x5 \n PSNR = {psnr}")
@@ -689,15 +1377,13 @@ class MainWindow(QMainWindow):
         original_image = tf.keras.preprocessing.image.img_to_array(original_image).astype(int)
         if self.type_img == "grayscale":
             original_image = original_image[..., 0]
-        original_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(original_image, 64))
+        grid = self.psnr_grid(original_image.shape)
 
         # noised image
-        image_path = f"{self.folder_path}noised.png"
-        noised_image = tf.keras.preprocessing.image.load_img(image_path, color_mode=self.type_img)
+        noised_image = tf.keras.preprocessing.image.load_img(self.noised_file(), color_mode=self.type_img)
         noised_image = tf.keras.preprocessing.image.img_to_array(noised_image).astype(int)
         if self.type_img == "grayscale":
             noised_image = noised_image[..., 0]
-        noised_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(noised_image, 64))
 
         # de-noised image
         image_path = f"{self.folder_path}auto-encoder.png"
@@ -705,7 +1391,6 @@ class MainWindow(QMainWindow):
         denoised_image = tf.keras.preprocessing.image.img_to_array(denoised_image).astype(int)
         if self.type_img == "grayscale":
             denoised_image = denoised_image[..., 0]
-        denoised_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(denoised_image, 64))
 
         # median 3x3 image
         image_path = f"{self.folder_path}median3.png"
@@ -713,7 +1398,6 @@ class MainWindow(QMainWindow):
         median3_image = tf.keras.preprocessing.image.img_to_array(median3_image).astype(int)
         if self.type_img == "grayscale":
             median3_image = median3_image[..., 0]
-        median3_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(median3_image, 64))
 
         # amf filter
         image_path = f"{self.folder_path}median_Filter.png"
@@ -721,7 +1405,6 @@ class MainWindow(QMainWindow):
         amf_image = tf.keras.preprocessing.image.img_to_array(amf_image).astype(int)
         if self.type_img == "grayscale":
             amf_image = amf_image[..., 0]
-        amf_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(amf_image, 64))
 
         # median 5x5 image
         image_path = f"{self.folder_path}median5.png"
@@ -729,7 +1412,6 @@ class MainWindow(QMainWindow):
         median5_image = tf.keras.preprocessing.image.img_to_array(median5_image).astype(int)
         if self.type_img == "grayscale":
             median5_image = median5_image[..., 0]
-        median5_image = MainWindow.reconstruct_patches(MainWindow.image_to_patches(median5_image, 64))
 
         # display images with matplotlib
         fig = plt.figure(figsize=(20, 20))
@@ -743,7 +1425,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 2)
         plt.imshow(noised_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(noised_image, original_image)
+        psnr = self.calculate_psnr(noised_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"NOISED \n PSNR = {psnr}")
@@ -751,7 +1433,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 3)
         plt.imshow(denoised_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(denoised_image, original_image)
+        psnr = self.calculate_psnr(denoised_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"DENOISED \n PSNR = {psnr}")
@@ -759,7 +1441,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 4)
         plt.imshow(median3_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(median3_image, original_image)
+        psnr = self.calculate_psnr(median3_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"MEDIAN 3x3 \n PSNR = {psnr}")
@@ -767,7 +1449,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 5)
         plt.imshow(amf_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(amf_image, original_image)
+        psnr = self.calculate_psnr(amf_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"ADAPTATIVE MEDIAN FILTER \n PSNR = {psnr}")
@@ -775,7 +1457,7 @@ class MainWindow(QMainWindow):
         fig.add_subplot(2, 3, 6)
         plt.imshow(median5_image)
         plt.axis('off')
-        psnr = self.calculate_psnr(median5_image, original_image)
+        psnr = self.calculate_psnr(median5_image, original_image, grid)
         psnr = "{:.2f}".format(psnr)
         plt.rcParams['font.size'] = 10
         plt.title(f"MEDIAN 5x5 \n PSNR = {psnr}")
@@ -826,10 +1508,12 @@ class MainWindow(QMainWindow):
                     self.type_img = "grayscale"
 
                 self.original_img = tf.keras.preprocessing.image.load_img(file_name, color_mode=self.type_img)
-                self.original_img = tf.keras.preprocessing.image.img_to_array(self.original_img)
+                self.original_img = tf.keras.preprocessing.image.img_to_array(self.original_img, dtype="uint8")
 
                 if self.type_img == "grayscale":
                     self.original_img = self.original_img[..., 0]
+                self.noise_fields = {}
+                self.image_noise_context = self.noise_context.spawn(1)[0]
 
                 # save original image in temporary folder
                 now = datetime.now()
@@ -862,23 +1546,19 @@ class MainWindow(QMainWindow):
             elif self.ui.checkBox_noise_sp.isChecked():
                 self.type_noise = "sp"
 
-            # normalize image /.255 before applying gaussian noise
-            if self.type_noise == "gauss":
-                self.original_img = np.array(self.original_img / 255)
-
             # apply noise to original image
-            if self.type_noise == "gauss":
-                self.noised_img = MainWindow.gauss_noise(self.original_img, self.noise_intensity)
-            else:
-                self.noised_img = MainWindow.sp_noise(self.original_img, self.noise_intensity)
-                self.noised_img = np.array(self.noised_img / 255)
+            self.noised_img = self.apply_noise(self.type_noise, self.noise_intensity)
 
-            # save image
-            self.noised_img = (self.noised_img * 255).astype(int)
-            self.save_image(self.noised_img, self.folder_path, "noised")
+            # save the seed needed to regenerate the image, and the image unless it's regenerated
+            if self.store_noised:
+                self.save_image(self.noised_img, self.folder_path, "noised")
+            metadata = {"type": self.type_noise, "intensity": self.noise_intensity,
+                        "shape": list(self.original_img.shape), "seed": self.image_noise_context.seed()}
+            with open(f"{self.folder_path}noise.json", "w") as file:
+                json.dump(metadata, file)
 
             # display noised image
-            self.ui.image_noised.setPixmap(self.folder_path+"noised.png")
+            self.display_noised(self.noised_img)
 
         # IMAGE CLASSIFICATION
         if btnWidget.objectName() == "btn_classification":
@@ -909,6 +1589,58 @@ class MainWindow(QMainWindow):
     def slider_listener(self):
         self.ui.label_intensity.setText(f"{str(self.ui.slider_intensity.value())}%")
 
+        # preview noise of the new intensity without saving it
+        if self.original_img is not None:
+            type_noise = self.type_noise
+            if self.ui.checkBox_noise_gauss.isChecked():
+                type_noise = "gauss"
+            elif self.ui.checkBox_noise_sp.isChecked():
+                type_noise = "sp"
+            self.display_noised(self.apply_noise(type_noise, self.ui.slider_intensity.value() / 100))
+
+    # Unit noise field of the loaded image, drawn once per image and noise type so that
+    # changing the intensity only rescales it
+    def noise_field(self, type_noise):
+        if type_noise not in self.noise_fields:
+            self.noise_fields[type_noise] = MainWindow.unit_noise(type_noise, self.original_img.shape,
+                                                                  self.image_noise_context)
+        return self.noise_fields[type_noise]
+
+    # Noised image of the execution as a path or an in-memory PNG file, the image is regenerated
+    # from noise.json when noised.png was not stored
+    def noised_file(self):
+        path = f"{self.folder_path}noised.png"
+        if os.path.isfile(path) or not os.path.isfile(f"{self.folder_path}noise.json"):
+            return path
+        file = io.BytesIO()
+        Image.fromarray(MainWindow.regenerate_noised(self.folder_path)).save(file, format="PNG")
+        file.seek(0)
+        return file
+
+    # Apply noise to original image with the cached noise field
+    def apply_noise(self, type_noise, intensity):
+        if type_noise == "gauss":
+            # gaussian noise is generated in a float32 buffer reused between calls
+            if self.noise_buffer is None or self.noise_buffer.shape != self.original_img.shape:
+                self.noise_buffer = np.empty(self.original_img.shape, dtype=np.float32)
+            MainWindow.gauss_noise(self.original_img, intensity, out=self.noise_buffer,
+                                   noise=self.noise_field(type_noise))
+            self.noise_buffer *= 255
+            return self.noise_buffer.astype(np.uint8)
+        else:
+            return MainWindow.sp_noise(self.original_img, intensity, rand=self.noise_field(type_noise))
+
+    # Display noised image from memory
+    def display_noised(self, image):
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        if image.ndim == 2:
+            image_format = QtGui.QImage.Format_Grayscale8
+        else:
+            image_format = QtGui.QImage.Format_RGB888
+        qimage = QtGui.QImage(image.data, width, height, image.strides[0], image_format)
+        self.ui.image_noised.setPixmap(QtGui.QPixmap.fromImage(qimage))
+
     # Click event filter
     def eventFilter(self, watched, event):
         if event.type() == QtCore.QEvent.MouseButtonPress:
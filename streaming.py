@@ -0,0 +1,145 @@
+# De-noising of images larger than memory, band of tile rows by band of tile rows
+# between memory-mapped files, peak memory is bounded by rows_in_memory tile rows
+# usage: python streaming.py input.npy output_dir [--noise gauss|sp] [--rows 4]
+#        python streaming.py input.raw output_dir --shape 20000 20000 3
+
+import argparse
+import os
+
+import cv2 as cv
+import numpy as np
+
+# app_modules must be imported before main to resolve the circular GUI imports
+import app_modules
+from main import MainWindow, PATCH_SIZES, model_registry
+
+# tifffile is only needed to stream TIFF images
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# rows around a band needed by the filters of each noise type, 5x5 filters and 15x15 AMF
+HALOS = {"gauss": 2, "sp": 7}
+
+
+# Open an uint8 image as a read-only memory map, raw files need their shape
+def open_image(path, shape=None, dtype=np.uint8):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r")
+    if extension in (".tif", ".tiff"):
+        if tifffile is None:
+            raise ImportError("tifffile is required to stream TIFF images")
+        # only uncompressed images stored contiguously can be memory-mapped
+        return tifffile.memmap(path, mode="r")
+    if shape is None:
+        raise ValueError("shape of raw image is required")
+    return np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+
+
+# Auto-encoder model of a noise type for images of the given number of channels
+def load_denoising_model(noise, channels):
+    if noise == "sp":
+        return model_registry.get("S-GRAY")
+    if channels == 3:
+        return model_registry.get("G-COLOR")
+    return model_registry.get("G-GRAY")
+
+
+# Bands of rows as (start, stop, read_start, read_stop), the rows of a band are read with a halo
+# of rows above and below so that filters see the same neighbours as on the whole image,
+# a last band shorter than min_rows is merged into the previous one
+def image_bands(height, band_rows, halo, min_rows=1):
+    starts = list(range(0, height, band_rows))
+    if len(starts) > 1 and height - starts[-1] < min_rows:
+        starts.pop()
+    for start, stop in zip(starts, starts[1:] + [height]):
+        yield start, stop, max(start - halo, 0), min(stop + halo, height)
+
+
+# image prediction of a band of rows in [0, 1], with patches predicted in batches,
+# see MainWindow.predict_patches for dedup and bypass_threshold
+def predict_band(band, model, patch_size, batch_size=32, dedup=False, bypass_threshold=0.0, stats=None):
+    patches, grid = MainWindow.image_patches(band.reshape(band.shape[0], band.shape[1], -1), patch_size)
+    patches = MainWindow.predict_patches(patches, model, batch_size, dedup, bypass_threshold, stats)
+    prediction = MainWindow.reconstruct_patches(patches, grid)
+    return (prediction * 255).clip(0, 255).astype(np.uint8).reshape(band.shape)
+
+
+# De-noise the rows of a band of an uint8 image, the band holds the halo rows around them,
+# returns the images saved by MainWindow.load_model by name
+def denoise_band(band, rows, noise, model, patch_size, batch_size=32, dedup=False, bypass_threshold=0.0,
+                 stats=None):
+    if noise == "gauss":
+        return {
+            "auto-encoder": predict_band(band[rows] / np.float32(255), model, patch_size, batch_size, dedup,
+                                         bypass_threshold, stats),
+            "median5": cv.medianBlur(band, 5)[rows],
+            "average": cv.blur(band, (5, 5))[rows],
+            "gaussian": cv.GaussianBlur(band, (5, 5), 0)[rows],
+        }
+
+    # salt & pepper auto-encoder is fed with the AMF filtered image
+    amf_band = MainWindow.amf(band)[rows]
+    return {
+        "auto-encoder": predict_band(amf_band / np.float32(255), model, patch_size, batch_size, dedup,
+                                     bypass_threshold, stats),
+        "median3": cv.medianBlur(band, 3)[rows],
+        "median5": cv.medianBlur(band, 5)[rows],
+        "median_Filter": amf_band,
+    }
+
+
+# De-noise a memory-mapped image into one .npy memory map per result image in output_dir,
+# rows_in_memory tile rows of the image are processed at once, dedup and bypass statistics are accumulated in stats
+def denoise_file(input_path, output_dir, noise="gauss", rows_in_memory=4, shape=None, model=None, batch_size=32,
+                 dedup=False, bypass_threshold=0.0, stats=None):
+    image = open_image(input_path, shape)
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[..., 0]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    if noise == "sp" and channels != 1:
+        raise ValueError("salt & pepper de-noising needs a grayscale image")
+    if model is None:
+        model = load_denoising_model(noise, channels)
+
+    # bands of whole tile rows keep the patch grid of every band aligned on the image patch grid,
+    # a last band of at least one tile row has enough rows to be reflect-padded as the whole image
+    patch_size = PATCH_SIZES[noise]
+    band_rows = rows_in_memory * patch_size
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    outputs = {}
+    for start, stop, read_start, read_stop in image_bands(image.shape[0], band_rows, HALOS[noise], patch_size):
+        band = np.ascontiguousarray(image[read_start:read_stop])
+        rows = slice(start - read_start, stop - read_start)
+        results = denoise_band(band, rows, noise, model, patch_size, batch_size, dedup, bypass_threshold, stats)
+        for name, result in results.items():
+            if name not in outputs:
+                outputs[name] = np.lib.format.open_memmap(os.path.join(output_dir, f"{name}.npy"), mode="w+",
+                                                          dtype=np.uint8, shape=image.shape)
+            outputs[name][start:stop] = result
+
+    for output in outputs.values():
+        output.flush()
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="De-noise a memory-mapped .npy, raw or TIFF image")
+    parser.add_argument("input_path")
+    parser.add_argument("output_dir")
+    parser.add_argument("--noise", choices=list(PATCH_SIZES), default="gauss")
+    parser.add_argument("--rows", type=int, default=4, help="tile rows in memory")
+    parser.add_argument("--shape", type=int, nargs="+", help="height width [channels] of raw image")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--dedup", action="store_true", help="predict identical patches once")
+    parser.add_argument("--bypass", type=float, default=0.0, help="variance below which patches are blurred")
+    args = parser.parse_args()
+    stats = {}
+    denoise_file(args.input_path, args.output_dir, args.noise, args.rows, args.shape, batch_size=args.batch_size,
+                 dedup=args.dedup, bypass_threshold=args.bypass, stats=stats)
+    if stats:
+        print(stats)